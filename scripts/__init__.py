@@ -17,9 +17,19 @@ __version__ = "1.0.0"
 __email__ = "kilianernst96@gmail.com"
 __license__ = "MIT"
 
-# Expose key functions and classes for easier imports
-from .utils.graph import Graph
-from .utils.a_start_algorithm import A_star
-from .utils.main_window import MainWindow
+# Expose key functions and classes for easier imports.
+# They are imported on first access, so headless users do not load PyQt5 and matplotlib.
+_lazy_imports = {
+    "Graph": ".utils.graph",
+    "A_star": ".utils.a_start_algorithm",
+    "MainWindow": ".utils.main_window",
+}
 
 __all__ = ["Graph", "A_star", "MainWindow"]
+
+
+def __getattr__(name):
+    if name in _lazy_imports:
+        import importlib
+        return getattr(importlib.import_module(_lazy_imports[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,11 @@
-from PyQt5.QtWidgets import QApplication
-from utils.main_window import MainWindow
+import os
+import sys
+
+# the modules import each other as "utils.*", works for "python scripts" and "python -m scripts"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.cli import main
 
 
 if __name__ == "__main__":
-        app = QApplication([])
-        window = MainWindow()
-        window.showMaximized()
-        window.show()
-        app.exec_()
\ No newline at end of file
+        main()
@@ -1,75 +1,158 @@
 # standard lib
-from typing import List, Optional, Union, Tuple, Callable, Set
-from dataclasses import dataclass, field
+from typing import List, Optional, Set, Dict, Tuple, TYPE_CHECKING
 
 
 # Third-party imports
 import heapq
+import numpy as np
 import networkx as nx  # type: ignore
-import matplotlib.pyplot as plt
-from matplotlib.axes import Axes
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 # Local application imports
-from utils.geometry import DistanceFunc, EuclidianDistance, ManhattenDistance
+from utils.geometry import DistanceFunc
 from utils.graph import Node, Graph
+from utils.parameter import A_star_parameter, TIE_BREAKING_POLICIES
+from utils.terrain import load_terrain
 import utils.constants as const
 
-@dataclass
-class A_star_parameter:
-    distance_method: DistanceFunc = field(default_factory=EuclidianDistance)
-    h_scale: float = 1.4
-    edge_weight: Union[float, Tuple] = 2.0
-    start_node: int = 1
-    target_node: int = 200
-    disabled_nodes: list[int] = field(default_factory=list[int])
-
 class A_star():
     """class for executing the algorithm steps
     """
 
     def __init__(self, parameter: A_star_parameter):
-        self.open_list: List[Node] = []
+        terrain = load_terrain(parameter.terrain) if parameter.terrain else None
+        self.graph = Graph(parameter.start_node, parameter.target_node, parameter.edge_weight,
+                           parameter.grid_width, parameter.grid_height, terrain)
+        # distance method, h_scale and targets the node h values were computed for
+        self._heuristic_key: Optional[tuple] = None
+        # automatic checkpoints every checkpoint_every expansions, see save_checkpoint
+        self.checkpoint_path: Optional[str] = None
+        self.checkpoint_every: int = 0
+        self.reset_search(parameter)
+
+    @classmethod
+    def from_checkpoint(cls, path: str) -> "A_star":
+        """Continues a search saved with save_checkpoint"""
+        from utils.checkpoint import load_checkpoint
+        return load_checkpoint(path)
+
+    def save_checkpoint(self, path: Optional[str] = None):
+        """Writes the search state to path, default checkpoint_path. See utils.checkpoint"""
+        from utils.checkpoint import save_checkpoint
+        path = path or self.checkpoint_path
+        if not path:
+            raise ValueError('No checkpoint file given!')
+        save_checkpoint(self, path)
+
+    @property
+    def expansions(self) -> int:
+        return len(self.closed_list)
+
+    @property
+    def open_list(self) -> List[Node]:
+        """Nodes in the open list, not in heap order"""
+        return [self.graph.node_by_id(node_id) for node_id in self._open_entries]
+
+    def _auto_checkpoint(self):
+        if self.checkpoint_path and self.checkpoint_every > 0 and self.expansions % self.checkpoint_every == 0:
+            self.save_checkpoint()
+
+    def reset_search(self, parameter: A_star_parameter):
+        """Starts a new search on the existing graph, e.g. after the start node or h_scale changed.
+        The graph parameters (see A_star_parameter.graph_key) must not have changed.
+        g and parent of all nodes are reset in O(1) by the search generation of the graph,
+        h is only recomputed if the distance method, h_scale or the target nodes changed.
+        """
+        if parameter.tie_breaking not in TIE_BREAKING_POLICIES:
+            raise ValueError(f'Unknown tie-breaking policy {parameter.tie_breaking}, use one of {TIE_BREAKING_POLICIES}!')
+        self.parameter = parameter.copy()
+        # open list: heap of (f, tiebreak, counter, node id) compared as plain tuples.
+        # Improved nodes are pushed again, entries whose counter is not the one in _open_entries are stale.
+        self.open_heap: List[Tuple[float, float, int, int]] = []
+        self._open_entries: Dict[int, int] = {}
+        self._pushes = 0
         self.closed_list: Set[Node] = set()
         self.current_node : Optional[Node] = None
-        self.graph = Graph(parameter.start_node, parameter.target_node, parameter.edge_weight)
-        heapq.heappush(self.open_list, self.graph.start_node)
-        self.init_heuristic_estimation(parameter.distance_method, parameter.h_scale)
-        self.graph.start_node.g = 0
+        self.graph.reset_search(parameter.start_node, parameter.target_node)
+        self.target_nodes: List[Node] = [self.graph.node_by_id(node_id) for node_id in parameter.all_target_nodes]
+        self.reached_target: Optional[Node] = None
+        heuristic_key = (str(parameter.distance_method), parameter.h_scale, tuple(parameter.all_target_nodes))
+        if heuristic_key != self._heuristic_key:
+            self.init_heuristic_estimation(parameter.distance_method, parameter.h_scale)
+            self._heuristic_key = heuristic_key
         self.disabled_nodes = parameter.disabled_nodes
+        self._disabled_ids = set(parameter.disabled_nodes)
+        self.tie_breaking = parameter.tie_breaking
+        start, target = self.graph.start_node.pos, self.graph.target_node.pos
+        self._line = (start.x - target.x, start.y - target.y, target.x, target.y)
+        self.graph.start_node.refresh()
+        self.graph.start_node.g = 0
+        # disabled nodes are never added to the open list
+        if parameter.start_node not in self._disabled_ids:
+            self._push(self.graph.start_node)
 
     def init_heuristic_estimation(self, dist_func: DistanceFunc, scale_factor: float):
-        for node in self.graph.nodes:
-            distance = scale_factor*dist_func(node.pos, self.graph.target_node.pos)
-            node.h = distance
+        """Sets h of every node to the scaled distance to the nearest target node"""
+        if self.graph.arrays is not None:
+            target_ids = [target._id for target in self.target_nodes]
+            self.graph.set_node_heuristic(self.graph.arrays.heuristic(dist_func, target_ids, scale_factor))
+            return
+        nodes = list(self.graph.nodes)
+        positions = np.array([(node.pos.x, node.pos.y) for node in nodes], dtype=np.float64)
+        distances = np.min([dist_func.get_distances(positions, target.pos) for target in self.target_nodes], axis=0)
+        for node, distance in zip(nodes, scale_factor*distances):
+            node.h = float(distance)
+
+    def _push(self, node: Node):
+        """Adds node with its current g to the open list, an older entry of the node becomes stale"""
+        g, h = node.g, node.h
+        if self.tie_breaking == "high_g":
+            tiebreak = -g
+        elif self.tie_breaking == "low_h":
+            tiebreak = h
+        elif self.tie_breaking == "cross_product":
+            dx, dy, target_x, target_y = self._line
+            tiebreak = abs((node.pos.x - target_x)*dy - dx*(node.pos.y - target_y))
+        else:
+            tiebreak = 0.0
+        self._pushes += 1
+        counter = -self._pushes if self.tie_breaking == "lifo" else self._pushes
+        self._open_entries[node._id] = counter
+        heapq.heappush(self.open_heap, (g + h, tiebreak, counter, node._id))
 
     def go_algo_step(self) -> Node:
-            new_node_found = False
-            while not new_node_found:
-                current_node = heapq.heappop(self.open_list)
-                if current_node in self.closed_list:
-                    raise NotImplementedError('Closed nodes should not be reopened!')
-                if current_node not in self.disabled_nodes:
-                    new_node_found = True
+            while True:
+                _, _, counter, node_id = heapq.heappop(self.open_heap)
+                # skips stale entries of nodes which were improved later
+                if self._open_entries.get(node_id) == counter:
+                    break
+            del self._open_entries[node_id]
+            current_node = self.graph.node_by_id(node_id)
             self.closed_list.add(current_node)
-            if current_node == self.graph.target_node:
-                print('Yeah! Target reached!')
+            if current_node in self.target_nodes:
+                print(f'Yeah! Target {current_node} reached!')
+                self.reached_target = current_node
                 return current_node
             for neighbour in list(self.graph.neighbors(current_node._id)):
                 cost_current_to_neighbour = self.graph[current_node._id][neighbour]['weight']
                 neighbour_g_new = current_node.g + cost_current_to_neighbour
-                #neighbour_f_new = neighbour.h + neighbour_g_new
-                if neighbour in self.open_list: 
+                if neighbour._id in self._disabled_ids:
+                    continue
+                if neighbour._id in self._open_entries:
                     if neighbour.g > neighbour_g_new:
                         neighbour.g = neighbour_g_new
                         neighbour.parent = current_node
+                        self._push(neighbour)
                 elif neighbour in self.closed_list:
                     if neighbour.g > neighbour_g_new:
                         raise NotImplementedError('Closed nodes should not need to be reopened!')
                 else:
+                    # first touch in this search, drops g and parent of an older search
+                    neighbour.refresh()
                     neighbour.g = neighbour_g_new
                     neighbour.parent = current_node
-                    heapq.heappush(self.open_list, neighbour)
-            heapq.heapify(self.open_list)
+                    self._push(neighbour)
             return current_node
 
     def full_run(self) -> bool:
@@ -77,9 +160,10 @@ class A_star():
         Return:
             bool: True if the target node is reached else False
         """
-        while self.open_list:
+        while self._open_entries:
             self.current_node = self.go_algo_step()
-            if self.current_node == self.graph.target_node:
+            self._auto_checkpoint()
+            if self.reached_target:
                  return True
         return False
 
@@ -91,14 +175,25 @@ class A_star():
         Return:
             bool: True if the target node is reached else False
         """
-        if not self.open_list:
+        if not self._open_entries:
             raise NotImplementedError('algo finished!!')
         self.current_node = self.go_algo_step()
-        if self.current_node == self.graph.target_node:
+        self._auto_checkpoint()
+        if self.reached_target:
             return True
         return False
 
-    def plot_graph(self, plt_axes: Optional[Axes] = None, show_current_node = False, show_open = False, show_closed = False, show_ideal_path = False):
+    def get_path(self) -> List[int]:
+        """Node ids from the start node to the reached target, empty if no target is reached yet"""
+        path = []
+        node = self.reached_target
+        while node:
+            path.append(node._id)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def plot_graph(self, plt_axes: Optional["Axes"] = None, show_current_node = False, show_open = False, show_closed = False, show_ideal_path = False):
         """Plots the current state of the algorithm in matplotlib
 
         Args:
@@ -107,6 +202,8 @@ class A_star():
             show_open: colors the nodes in the current open list
             show_closed: colors the nodes in the current closed list
         """
+        import matplotlib.pyplot as plt
+
         # retrieve nodes positions
         pos_dict = {}
         for node in self.graph.nodes:
@@ -133,8 +230,9 @@ class A_star():
                                    linewidths=const.NODE_EDGE_WIDTH,
                                    edgecolors=const.NODE_EDGE_COLOR_CLOSED)
             
-        if self.disabled_nodes:
-            nx.draw_networkx_nodes(self.graph, pos_dict, self.disabled_nodes, ax=plt_axes, node_size=const.NODE_SIZE,
+        disabled_nodes = list(self.disabled_nodes) + self.graph.blocked_node_ids
+        if disabled_nodes:
+            nx.draw_networkx_nodes(self.graph, pos_dict, disabled_nodes, ax=plt_axes, node_size=const.NODE_SIZE,
                                    node_color=const.NODE_COLOR_DISABLE,
                                    linewidths=const.NODE_EDGE_WIDTH,
                                    edgecolors=const.NODE_EDGE_COLOR_DISABLE)
@@ -164,8 +262,8 @@ class A_star():
                                linewidths=const.NODE_EDGE_WIDTH,
                                edgecolors=const.NODE_EDGE_COLOR_START)
 
-        # Target node
-        nx.draw_networkx_nodes(self.graph, pos_dict, [self.graph._target_node_id], ax=plt_axes, node_size=const.NODE_SIZE, 
+        # Target nodes
+        nx.draw_networkx_nodes(self.graph, pos_dict, self.target_nodes, ax=plt_axes, node_size=const.NODE_SIZE, 
                                node_color=const.NODE_COLOR_TARGET,
                                linewidths=const.NODE_EDGE_WIDTH,
                                edgecolors=const.NODE_EDGE_COLOR_TARGET)
@@ -174,7 +272,74 @@ class A_star():
         nx.draw_networkx_edge_labels(self.graph, pos_dict, ax=plt_axes, edge_labels=edge_labels, font_color=const.EDGE_COLOR)
         plt.show()
 
+    def plot_path(self, path: List[int], plt_axes: Optional["Axes"] = None):
+        """Colors the nodes of a path given as node ids, e.g. a solution of another search engine
+
+        Args:
+            path: node ids from start to target
+            plt_axes: matplotlib axes for plotting
+        """
+        pos_dict = {}
+        for node in self.graph.nodes:
+            pos_dict.update({node: (node.pos.x, node.pos.y)})
+        path_nodes = [self.graph.node_by_id(node_id) for node_id in path[1:-1]]
+        if path_nodes:
+            nx.draw_networkx_nodes(self.graph, pos_dict, path_nodes, ax=plt_axes, node_size=const.NODE_SIZE,
+                                   node_color=const.NODE_COLOR_IDEAL_PATH,
+                                   edgecolors=const.NODE_EDGE_COLOR_IDEAL,
+                                   linewidths=const.NODE_EDGE_WIDTH)
+
+    def plot_distance_field(self, distances, plt_axes: Optional["Axes"] = None):
+        """Plots the graph as cost heatmap, e.g. from array_search.distance_field
+
+        Args:
+            distances: cost per node index (node id - 1), inf for unreached nodes
+            plt_axes: matplotlib axes for plotting
+        """
+        pos_dict = {}
+        for node in self.graph.nodes:
+            pos_dict.update({node: (node.pos.x, node.pos.y)})
+        nx.draw_networkx_edges(self.graph, pos_dict, ax=plt_axes, edge_color=const.NODE_EDGE_COLOR_DEFAULT)
+
+        reached_nodes = [node for node in self.graph.nodes if distances[node._id - 1] != float('inf')]
+        unreached_nodes = [node for node in self.graph.nodes if distances[node._id - 1] == float('inf')]
+        if unreached_nodes:
+            nx.draw_networkx_nodes(self.graph, pos_dict, unreached_nodes, ax=plt_axes, node_size=const.NODE_SIZE,
+                                   node_color=const.NODE_COLOR_UNREACHED,
+                                   linewidths=const.NODE_EDGE_WIDTH,
+                                   edgecolors=const.NODE_EDGE_COLOR_DEFAULT)
+        if reached_nodes:
+            collection = nx.draw_networkx_nodes(self.graph, pos_dict, reached_nodes, ax=plt_axes, node_size=const.NODE_SIZE,
+                                                node_color=[distances[node._id - 1] for node in reached_nodes],
+                                                cmap=const.HEATMAP_CMAP,
+                                                linewidths=const.NODE_EDGE_WIDTH,
+                                                edgecolors=const.NODE_EDGE_COLOR_DEFAULT)
+            if plt_axes is not None:
+                plt_axes.figure.colorbar(collection, ax=plt_axes, label='cost from start node')
+        nx.draw_networkx_labels(self.graph, pos_dict, ax=plt_axes, font_size=10)
+
 
 if __name__ == "__main__":
-        algo = A_star(A_star_parameter())
-        algo.full_run()
\ No newline at end of file
+    import contextlib
+    import io
+    import time
+    import timeit
+    from utils.geometry import ManhattenDistance
+
+    # uniform grid: many nodes with equal f, the tie-breaking decides how many of them are expanded
+    for tie_breaking in TIE_BREAKING_POLICIES:
+        algo = A_star(A_star_parameter(distance_method=ManhattenDistance(), h_scale=1.0, grid_width=100, grid_height=100,
+                                       target_node=10000, tie_breaking=tie_breaking))
+        t_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            algo.full_run()
+        print(f'{tie_breaking:14s} expansions {algo.expansions:6d}, cost {algo.reached_target.g}, '
+              f'{(time.perf_counter() - t_start)*1e3:.1f} ms')
+
+    # cost of one open list comparison: Node.__lt__ (f property) vs. primitive heap keys
+    a, b = algo.graph.node_by_id(5), algo.graph.node_by_id(6)
+    key_a, key_b = (a.f, -a.g, 1, 5), (b.f, -b.g, 2, 6)
+    runs = 1000000
+    t_node = timeit.timeit(lambda: a < b, number=runs)/runs
+    t_key = timeit.timeit(lambda: key_a < key_b, number=runs)/runs
+    print(f'comparison Node: {t_node*1e9:.0f} ns, tuple key: {t_key*1e9:.0f} ns')
@@ -0,0 +1,119 @@
+"""Off-screen export of a search as video, GIF or PNG sequence.
+The search is recorded once with array_search.record_search, the frames are rendered with the
+Agg backend (no Qt) in a process pool and piped in order to ffmpeg.
+"""
+# standard lib
+from typing import Optional, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import subprocess
+
+# Third-party imports
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import ListedColormap
+
+# Local application imports
+from utils.array_search import SearchRecording
+from utils.graph_plot import recording_states, STATE_COLORS
+
+FRAME_DPI = 100
+
+# set in every worker process by _init_worker
+_worker_state: dict = {}
+
+
+def frame_size(width: int, height: int, frame_width: int) -> Tuple[int, int]:
+    """Pixel size of a frame, even numbers as required by most video codecs"""
+    frame_width = max(2, frame_width - frame_width % 2)
+    frame_height = max(2, int(round(frame_width*height/width/2))*2)
+    return frame_width, frame_height
+
+
+def _init_worker(recording: SearchRecording, width: int, height: int, frame_width: int, png_dir: Optional[str]):
+    frame_w, frame_h = frame_size(width, height, frame_width)
+    figure = Figure(figsize=(frame_w/FRAME_DPI, frame_h/FRAME_DPI), dpi=FRAME_DPI)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    image = ax.imshow(np.zeros((height, width)), cmap=ListedColormap(STATE_COLORS), vmin=0, vmax=len(STATE_COLORS) - 1,
+                      origin='lower', interpolation='nearest', aspect='auto')
+    label = figure.text(0.01, 0.99, '', va='top', fontsize=9, backgroundcolor='white')
+    _worker_state.update(recording=recording, width=width, height=height, canvas=canvas, image=image, label=label,
+                         png_dir=png_dir)
+
+
+def _render_frame(step: int) -> bytes:
+    """Renders the state after step expansions. Returns raw RGB bytes or writes a PNG file (empty bytes)."""
+    state = _worker_state
+    recording: SearchRecording = state['recording']
+    state['image'].set_data(recording_states(recording, step).reshape(state['height'], state['width']))
+    state['label'].set_text(f'step {step}/{recording.step_count}')
+    canvas: FigureCanvasAgg = state['canvas']
+    if state['png_dir'] is not None:
+        canvas.figure.savefig(os.path.join(state['png_dir'], f'frame_{step:08d}.png'), dpi=FRAME_DPI)
+        return b''
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:, :, :3].tobytes()
+
+
+def frame_steps(recording: SearchRecording, every: int = 1) -> List[int]:
+    """Sampled steps, the final state is always included"""
+    steps = list(range(0, recording.step_count + 1, max(1, every)))
+    if steps[-1] != recording.step_count:
+        steps.append(recording.step_count)
+    return steps
+
+
+def _encoder_command(out_path: str, frame_w: int, frame_h: int, fps: int) -> List[str]:
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg not found! Install it or export a PNG sequence into a directory.')
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+               '-s', f'{frame_w}x{frame_h}', '-r', str(fps), '-i', '-']
+    if out_path.lower().endswith('.mp4'):
+        command += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p']
+    return command + [out_path]
+
+
+def export_animation(recording: SearchRecording, width: int, height: int, out_path: str, every: int = 1,
+                     fps: int = 25, frame_width: int = 800, workers: Optional[int] = None) -> int:
+    """Renders the recorded search off-screen.
+    Args:
+        recording: recorded search on a width x height grid
+        width: grid nodes in x direction
+        height: grid nodes in y direction
+        out_path: video/GIF file (encoded by ffmpeg) or directory for a PNG sequence
+        every: renders only every Nth step
+        fps: frames per second of the video
+        frame_width: frame width in pixel, the height follows from the grid aspect ratio
+        workers: number of rendering processes, None for the CPU count
+    Returns:
+        int: number of exported frames
+    """
+    steps = frame_steps(recording, every)
+    png_dir = None
+    encoder = None
+    if os.path.isdir(out_path) or not os.path.splitext(out_path)[1]:
+        png_dir = out_path
+        os.makedirs(png_dir, exist_ok=True)
+    else:
+        frame_w, frame_h = frame_size(width, height, frame_width)
+        encoder = subprocess.Popen(_encoder_command(out_path, frame_w, frame_h, fps), stdin=subprocess.PIPE)
+
+    chunksize = max(1, len(steps)//(4*(workers or os.cpu_count() or 1)))
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(recording, width, height, frame_width, png_dir)) as pool:
+            # map keeps the frame order while the frames are rendered in parallel
+            for frame in pool.map(_render_frame, steps, chunksize=chunksize):
+                if encoder is not None:
+                    encoder.stdin.write(frame)
+    finally:
+        if encoder is not None:
+            encoder.stdin.close()
+            if encoder.wait() != 0:
+                raise RuntimeError(f'ffmpeg failed with exit code {encoder.returncode}!')
+    return len(steps)
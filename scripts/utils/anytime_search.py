@@ -0,0 +1,162 @@
+"""Anytime repairing A* (ARA*, Likhachev et al. 2003) on top of the weighted A* of h_scale.
+The first solution is found with the large weight h_scale, then the weight is decreased towards 1
+and the search state is reused to publish improved solutions.
+"""
+# standard lib
+from typing import List, Optional, Iterator, Set
+from dataclasses import dataclass
+import heapq
+import time
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter
+import utils.constants as const
+
+
+@dataclass
+class AnytimeSolution:
+    path: List[int]         # node ids from start to the reached target
+    cost: float
+    weight: float           # heuristic weight the solution was found with
+    bound: float            # proven suboptimality bound: cost <= bound * optimal cost
+    expansions: int         # expansions of all iterations so far
+    elapsed: float          # seconds since the search started
+    target: int
+
+
+class ARA_star():
+    """Anytime weighted A* which reuses the search state between the iterations.
+    The bounds are only valid if the unscaled heuristic (distance_method without h_scale) is admissible.
+    """
+
+    def __init__(self, arrays: GraphArrays, parameter: A_star_parameter,
+                 weight_step: float = const.ARA_WEIGHT_STEP, final_weight: float = 1.0):
+        self.arrays = arrays
+        self.disabled = arrays.disabled_mask(parameter.disabled_nodes)
+        self.h = arrays.heuristic(parameter.distance_method, parameter.all_target_nodes, 1.0)
+        self.weight = max(parameter.h_scale, final_weight)
+        self.weight_step = weight_step
+        self.final_weight = final_weight
+        self.is_target = np.zeros(arrays.node_count, dtype=np.bool_)
+        for node_id in parameter.all_target_nodes:
+            self.is_target[arrays.index_of(node_id)] = True
+
+        start = arrays.index_of(parameter.start_node)
+        self.g = np.full(arrays.node_count, np.inf)
+        self.parent = np.full(arrays.node_count, -1, dtype=np.int64)
+        self.g[start] = 0.0
+        # a disabled start node is never expanded, like in A_star and array_a_star
+        self.open_list: List[tuple] = [] if self.disabled[start] else [(self.weight*self.h[start], start)]
+        self.closed_list: Set[int] = set()
+        self.incons_list: Set[int] = set()
+        self.expansions = 0
+        self.best_target = -1
+
+    def _goal_cost(self) -> float:
+        if self.best_target == -1:
+            return float('inf')
+        return self.g[self.best_target]
+
+    def _improve_path(self, deadline: float, max_expansions: Optional[int]) -> bool:
+        """One weighted A* pass. Returns False if the budget ran out before it finished."""
+        arrays = self.arrays
+        while self.open_list:
+            f, node = self.open_list[0]
+            if node in self.closed_list or f > self.g[node] + self.weight*self.h[node]:
+                # stale heap entry
+                heapq.heappop(self.open_list)
+                continue
+            if self._goal_cost() <= f:
+                return True
+            if time.perf_counter() > deadline or (max_expansions is not None and self.expansions >= max_expansions):
+                return False
+            heapq.heappop(self.open_list)
+            self.closed_list.add(node)
+            self.expansions += 1
+            if self.is_target[node]:
+                if self.g[node] < self._goal_cost():
+                    self.best_target = node
+                continue
+            for k in range(arrays.indptr[node], arrays.indptr[node + 1]):
+                neighbour = arrays.indices[k]
+                if self.disabled[neighbour]:
+                    continue
+                neighbour_g_new = self.g[node] + arrays.weights[k]
+                if neighbour_g_new < self.g[neighbour]:
+                    self.g[neighbour] = neighbour_g_new
+                    self.parent[neighbour] = node
+                    if self.is_target[neighbour] and neighbour_g_new < self._goal_cost():
+                        self.best_target = neighbour
+                    if neighbour in self.closed_list:
+                        self.incons_list.add(neighbour)
+                    else:
+                        heapq.heappush(self.open_list, (neighbour_g_new + self.weight*self.h[neighbour], neighbour))
+        return True
+
+    def _lower_bound(self) -> float:
+        """Lower bound of the optimal cost: minimal unweighted f of all open and inconsistent nodes"""
+        candidates = [node for _, node in self.open_list if node not in self.closed_list]
+        candidates.extend(self.incons_list)
+        if not candidates:
+            return self._goal_cost()
+        candidates = np.array(candidates, dtype=np.int64)
+        return float(np.min(self.g[candidates] + self.h[candidates]))
+
+    def solutions(self, time_budget: Optional[float] = None, max_expansions: Optional[int] = None) -> Iterator[AnytimeSolution]:
+        """Yields every improved solution until the bound reaches 1 or the budget is used up.
+        Args:
+            time_budget: maximal runtime in seconds, None for unlimited
+            max_expansions: maximal number of expansions over all iterations, None for unlimited
+        """
+        t_start = time.perf_counter()
+        deadline = float('inf') if time_budget is None else t_start + time_budget
+        last_cost = float('inf')
+        while True:
+            finished = self._improve_path(deadline, max_expansions)
+            if not finished:
+                return
+            goal_cost = self._goal_cost()
+            if goal_cost == float('inf'):
+                # target not reachable
+                return
+            lower_bound = self._lower_bound()
+            bound = self.weight
+            if lower_bound > 0:
+                bound = min(self.weight, goal_cost/lower_bound)
+            if goal_cost < last_cost or bound <= 1.0:
+                last_cost = goal_cost
+                yield AnytimeSolution(self.arrays.path_ids(self.parent, self.best_target), float(goal_cost), self.weight,
+                                      max(bound, 1.0), self.expansions, time.perf_counter() - t_start,
+                                      self.arrays.id_of(self.best_target))
+            if bound <= 1.0 or self.weight <= self.final_weight:
+                return
+            # decrease the weight and reuse the search state
+            self.weight = max(self.final_weight, self.weight - self.weight_step)
+            open_nodes = {node for _, node in self.open_list if node not in self.closed_list} | self.incons_list
+            self.open_list = [(self.g[node] + self.weight*self.h[node], node) for node in open_nodes]
+            heapq.heapify(self.open_list)
+            self.incons_list = set()
+            self.closed_list = set()
+
+    def run(self, time_budget: Optional[float] = None, max_expansions: Optional[int] = None) -> Optional[AnytimeSolution]:
+        """Returns the best solution found within the budget"""
+        best = None
+        for solution in self.solutions(time_budget, max_expansions):
+            best = solution
+        return best
+
+
+if __name__ == "__main__":
+    from utils.a_start_algorithm import A_star
+    from utils.geometry import ManhattenDistance
+
+    # manhatten distance is admissible for edge weights >= 2 (node spacing is 2)
+    parameter = A_star_parameter(distance_method=ManhattenDistance(), h_scale=3.0, edge_weight=(2, 9))
+    arrays = GraphArrays.from_graph(A_star(parameter).graph)
+    for solution in ARA_star(arrays, parameter).solutions():
+        print(f'weight {solution.weight:.1f}: cost {solution.cost} (bound {solution.bound:.3f}), '
+              f'{solution.expansions} expansions, {solution.elapsed*1e3:.2f} ms')
@@ -0,0 +1,375 @@
+"""Array based A*/Dijkstra search for headless runs.
+The kernel is compiled with numba when it is installed, otherwise the same code runs as plain python.
+"""
+# standard lib
+from typing import List, Optional, Iterable, Union
+from dataclasses import dataclass, field
+import functools
+import heapq
+import importlib.util
+
+# Third-party imports
+import numpy as np
+
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+# size of one (f, tiebreak, counter, node) entry of the open heap in a numba list
+HEAP_ENTRY_BYTES = 4*8
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter, TIE_BREAKING_POLICIES
+import utils.constants as const
+
+
+def _jit(func):
+    """Compiles func with numba on its first call if numba is available, the python function is used otherwise.
+    numba is only imported when a kernel is needed, which keeps the import of this module cheap.
+    """
+    compiled = None
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        nonlocal compiled
+        if compiled is None:
+            compiled = func
+            if NUMBA_AVAILABLE:
+                import numba  # type: ignore
+                compiled = numba.njit(cache=True)(func)
+        return compiled(*args)
+    return wrapper
+
+
+@dataclass
+class SearchResult:
+    reached: bool
+    path: List[int] = field(default_factory=list)  # node ids from start to target
+    cost: float = float('inf')
+    expansions: int = 0
+    target: Optional[int] = None  # id of the reached target node
+    peak_open: int = 0  # maximal number of open heap entries, see search_memory
+
+
+@_jit
+def _search_kernel(indptr, indices, weights, h, disabled, start, is_target, tiebreak, policy):
+    node_count = h.shape[0]
+    g = np.full(node_count, np.inf)
+    parent = np.full(node_count, -1, dtype=np.int64)
+    closed = np.zeros(node_count, dtype=np.bool_)
+    g[start] = 0.0
+    # heap keys (f, tiebreak, counter, node), see _tiebreak_keys for policy and tiebreak
+    open_heap = [(h[start], 0.0, 0, start)]
+    pushes = 0
+    expansions = 0
+    peak_open = 1
+    while len(open_heap) > 0:
+        f, _, _, node = heapq.heappop(open_heap)
+        if closed[node] or f > g[node] + h[node]:
+            # stale heap entry
+            continue
+        closed[node] = True
+        if disabled[node]:
+            continue
+        expansions += 1
+        if is_target[node]:
+            return g, parent, expansions, node, peak_open
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[k]
+            if closed[neighbour]:
+                continue
+            neighbour_g_new = g[node] + weights[k]
+            if neighbour_g_new < g[neighbour]:
+                g[neighbour] = neighbour_g_new
+                parent[neighbour] = node
+                pushes += 1
+                key = -neighbour_g_new if policy == 2 else tiebreak[neighbour]
+                heapq.heappush(open_heap, (neighbour_g_new + h[neighbour], key, -pushes if policy == 1 else pushes, neighbour))
+                peak_open = max(peak_open, len(open_heap))
+    return g, parent, expansions, -1, peak_open
+
+
+@_jit
+def _distance_field_kernel(indptr, indices, weights, disabled, source, cutoff, is_target, target_count):
+    node_count = disabled.shape[0]
+    dist = np.full(node_count, np.inf)
+    parent = np.full(node_count, -1, dtype=np.int64)
+    settled = np.zeros(node_count, dtype=np.bool_)
+    if disabled[source]:
+        # a blocked source reaches nothing, like a disabled start node in _search_kernel
+        return dist, parent, 0
+    dist[source] = 0.0
+    open_heap = [(0.0, source)]
+    settled_count = 0
+    targets_left = target_count
+    while len(open_heap) > 0:
+        d, node = heapq.heappop(open_heap)
+        if settled[node] or d > dist[node]:
+            continue
+        if d > cutoff:
+            break
+        settled[node] = True
+        settled_count += 1
+        if is_target[node]:
+            targets_left -= 1
+            if targets_left == 0:
+                break
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[k]
+            if settled[neighbour] or disabled[neighbour]:
+                continue
+            neighbour_d_new = d + weights[k]
+            if neighbour_d_new < dist[neighbour] and neighbour_d_new <= cutoff:
+                dist[neighbour] = neighbour_d_new
+                parent[neighbour] = node
+                heapq.heappush(open_heap, (neighbour_d_new, neighbour))
+    # tentative distances of unsettled nodes are not final
+    dist[~settled] = np.inf
+    parent[~settled] = -1
+    return dist, parent, settled_count
+
+
+@dataclass
+class DistanceField:
+    """Result of a one-to-all search. Unreached nodes have distance inf and parent -1."""
+    arrays: GraphArrays
+    source_node: int
+    distances: np.ndarray   # cost from the source per node index
+    parents: np.ndarray     # predecessor index on the shortest path per node index
+    settled: int
+
+    def cost_to(self, node_id: int) -> float:
+        return float(self.distances[self.arrays.index_of(node_id)])
+
+    def path_to(self, node_id: int) -> List[int]:
+        """Shortest path from the source to node_id, empty if the node was not reached"""
+        index = self.arrays.index_of(node_id)
+        if not np.isfinite(self.distances[index]):
+            return []
+        return self.arrays.path_ids(self.parents, index)
+
+
+def distance_field(arrays: GraphArrays, source_node: int, cutoff: float = float('inf'),
+                   target_nodes: Optional[Iterable[int]] = None, disabled: Optional[np.ndarray] = None) -> DistanceField:
+    """Dijkstra from one source to all nodes in a single pass.
+    Args:
+        arrays: graph in array layout, disabled nodes are treated as blocked
+        source_node: id of the source node
+        cutoff: nodes with a higher cost than cutoff are not settled
+        target_nodes: stops as soon as all of these nodes are settled, None searches the whole graph
+        disabled: mask of the blocked nodes, arrays.disabled if None
+    Returns:
+        DistanceField: dense distance and parent arrays, all distances are inf for a disabled source
+    """
+    is_target = np.zeros(arrays.node_count, dtype=np.bool_)
+    target_count = 0
+    if target_nodes is not None:
+        for node_id in target_nodes:
+            is_target[arrays.index_of(node_id)] = True
+        target_count = int(is_target.sum())
+    if disabled is None:
+        disabled = arrays.disabled
+    dist, parent, settled = _distance_field_kernel(arrays.indptr, arrays.indices, arrays.weights, disabled,
+                                                   arrays.index_of(source_node), float(cutoff),
+                                                   is_target, target_count)
+    return DistanceField(arrays, source_node, dist, parent, int(settled))
+
+
+def _tiebreak_keys(arrays: GraphArrays, h: np.ndarray, tie_breaking: str, start: int, target: int):
+    """Policy code of the search kernel and the tiebreak key per node index for a policy of TIE_BREAKING_POLICIES.
+    Codes: 0 static key per node with insertion order (FIFO), 1 LIFO, 2 larger g first.
+    """
+    if tie_breaking not in TIE_BREAKING_POLICIES:
+        raise ValueError(f'Unknown tie-breaking policy {tie_breaking}, use one of {TIE_BREAKING_POLICIES}!')
+    if tie_breaking == "low_h":
+        return 0, np.ascontiguousarray(h, dtype=np.float64)
+    if tie_breaking == "cross_product":
+        dx, dy = arrays.xy[start] - arrays.xy[target]
+        offset = arrays.xy - arrays.xy[target]
+        return 0, np.abs(offset[:, 0]*dy - dx*offset[:, 1])
+    return {"fifo": 0, "lifo": 1, "high_g": 2}[tie_breaking], np.zeros(arrays.node_count, dtype=np.float64)
+
+
+def array_search(arrays: GraphArrays, start_node: int, target_nodes: Union[int, Iterable[int]],
+                 h: np.ndarray, tie_breaking: str = const.TIE_BREAKING,
+                 disabled: Optional[np.ndarray] = None) -> SearchResult:
+    """Runs the search kernel on prepared arrays.
+    Args:
+        arrays: graph in array layout
+        start_node: id of the start node
+        target_nodes: id of the target node or ids of several targets, the search stops at the first settled one
+        h: heuristic value per node index, zeros for Dijkstra.
+           Has to be a lower bound for the nearest target to get the nearest target.
+        tie_breaking: order of nodes with equal f, see parameter.TIE_BREAKING_POLICIES
+        disabled: mask of the nodes which are not expanded, arrays.disabled if None
+    Returns:
+        SearchResult: path and cost to the reached target
+    """
+    if isinstance(target_nodes, (int, np.integer)):
+        target_nodes = [target_nodes]
+    target_nodes = list(target_nodes)
+    is_target = np.zeros(arrays.node_count, dtype=np.bool_)
+    for node_id in target_nodes:
+        is_target[arrays.index_of(node_id)] = True
+    if disabled is None:
+        disabled = arrays.disabled
+    start = arrays.index_of(start_node)
+    policy, tiebreak = _tiebreak_keys(arrays, h, tie_breaking, start, arrays.index_of(target_nodes[0]))
+    g, parent, expansions, target, peak_open = _search_kernel(arrays.indptr, arrays.indices, arrays.weights,
+                                                   np.ascontiguousarray(h, dtype=np.float64),
+                                                   disabled, start, is_target, tiebreak, policy)
+    if target == -1:
+        return SearchResult(False, expansions=int(expansions), peak_open=int(peak_open))
+    return SearchResult(True, arrays.path_ids(parent, target), float(g[target]), int(expansions), arrays.id_of(target),
+                        int(peak_open))
+
+
+def search_memory(node_count: int, peak_open: int) -> int:
+    """Bytes of the buffers of one array_search, which tracemalloc does not see inside a numba kernel:
+    g, parent, h and tiebreak (8 bytes per node), closed, is_target and the disabled mask (1 byte per node)
+    and the peak of the open heap with (f, tiebreak, counter, node) entries of 4*8 bytes
+    """
+    return node_count*(4*8 + 3) + peak_open*HEAP_ENTRY_BYTES
+
+
+@_jit
+def _recording_kernel(indptr, indices, weights, h, disabled, start, is_target, tiebreak, policy):
+    node_count = h.shape[0]
+    g = np.full(node_count, np.inf)
+    parent = np.full(node_count, -1, dtype=np.int64)
+    open_step = np.full(node_count, -1, dtype=np.int64)
+    closed_step = np.full(node_count, -1, dtype=np.int64)
+    expanded = np.empty(node_count, dtype=np.int64)
+    g[start] = 0.0
+    open_step[start] = 0
+    # same heap keys as _search_kernel
+    open_heap = [(h[start], 0.0, 0, start)]
+    pushes = 0
+    expansions = 0
+    while len(open_heap) > 0:
+        f, _, _, node = heapq.heappop(open_heap)
+        if closed_step[node] != -1 or f > g[node] + h[node]:
+            continue
+        if disabled[node]:
+            # never expanded, but must not be popped again
+            closed_step[node] = node_count + 1
+            continue
+        closed_step[node] = expansions
+        expanded[expansions] = node
+        expansions += 1
+        if is_target[node]:
+            break
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[k]
+            if closed_step[neighbour] != -1:
+                continue
+            neighbour_g_new = g[node] + weights[k]
+            if neighbour_g_new < g[neighbour]:
+                g[neighbour] = neighbour_g_new
+                parent[neighbour] = node
+                if open_step[neighbour] == -1:
+                    open_step[neighbour] = expansions
+                pushes += 1
+                key = -neighbour_g_new if policy == 2 else tiebreak[neighbour]
+                heapq.heappush(open_heap, (neighbour_g_new + h[neighbour], key, -pushes if policy == 1 else pushes, neighbour))
+    return expanded[:expansions].copy(), open_step, closed_step, parent
+
+
+@dataclass
+class SearchRecording:
+    """Compact history of a search: the state after any number of expansions can be restored from it.
+    Step k means k expansions are done, step 0 is the initial state with only the start node open.
+    """
+    expanded: np.ndarray      # node index per expansion in expansion order
+    open_step: np.ndarray     # step at which a node entered the open list, -1 if never
+    closed_step: np.ndarray   # expansion number of a node (closed after step closed_step + 1), -1 if never
+    parent: np.ndarray        # final parent index, valid for closed nodes
+    start: int
+    targets: np.ndarray       # target node indices
+    disabled: np.ndarray
+
+    @property
+    def step_count(self) -> int:
+        return self.expanded.shape[0]
+
+    def open_and_closed(self, step: int):
+        """Boolean masks of the open and closed nodes after step expansions"""
+        closed = (self.closed_step != -1) & (self.closed_step < step)
+        opened = (self.open_step != -1) & (self.open_step <= step) & ~closed & ~self.disabled
+        return opened, closed
+
+    def current(self, step: int) -> int:
+        """Index of the node expanded last, -1 at step 0"""
+        return int(self.expanded[step - 1]) if step > 0 else -1
+
+    def path(self, step: int) -> List[int]:
+        """Indices of the ideal path from the start to the current node"""
+        path = []
+        index = self.current(step)
+        while index != -1:
+            path.append(index)
+            index = self.parent[index]
+        return path[::-1]
+
+
+def record_search(arrays: GraphArrays, parameter: A_star_parameter, dijkstra: bool = False) -> SearchRecording:
+    """Same search as array_a_star, but records when every node was opened and closed"""
+    disabled = arrays.disabled_mask(parameter.disabled_nodes)
+    target_nodes = parameter.all_target_nodes
+    if dijkstra:
+        h = np.zeros(arrays.node_count, dtype=np.float64)
+    else:
+        h = arrays.heuristic(parameter.distance_method, target_nodes, parameter.h_scale)
+    targets = np.array([arrays.index_of(node_id) for node_id in target_nodes], dtype=np.int64)
+    is_target = np.zeros(arrays.node_count, dtype=np.bool_)
+    is_target[targets] = True
+    start = arrays.index_of(parameter.start_node)
+    policy, tiebreak = _tiebreak_keys(arrays, h, parameter.tie_breaking, start, int(targets[0]))
+    expanded, open_step, closed_step, parent = _recording_kernel(arrays.indptr, arrays.indices, arrays.weights,
+                                                                 np.ascontiguousarray(h, dtype=np.float64),
+                                                                 disabled, start, is_target, tiebreak, policy)
+    return SearchRecording(expanded, open_step, closed_step, parent, start, targets, disabled)
+
+
+def array_a_star(arrays: GraphArrays, parameter: A_star_parameter, dijkstra: bool = False) -> SearchResult:
+    """Array based counterpart of A_star.full_run for the given parameters.
+    Args:
+        arrays: graph in array layout, e.g. GraphArrays.from_graph(A_star(parameter).graph)
+        parameter: algorithm parameter (distance method, h_scale, start, target, disabled nodes, tie-breaking)
+        dijkstra: ignores the heuristic if True
+    """
+    target_nodes = parameter.all_target_nodes
+    if dijkstra:
+        h = np.zeros(arrays.node_count, dtype=np.float64)
+    else:
+        h = arrays.heuristic(parameter.distance_method, target_nodes, parameter.h_scale)
+    return array_search(arrays, parameter.start_node, target_nodes, h, parameter.tie_breaking,
+                        arrays.disabled_mask(parameter.disabled_nodes))
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+    from utils.a_start_algorithm import A_star
+
+    print(f'numba: {NUMBA_AVAILABLE}')
+    for width, height in ((const.GRID_WIDTH, const.GRID_HEIGHT), (100, 100)):
+        parameter = A_star_parameter(grid_width=width, grid_height=height, target_node=width*height)
+        algo = A_star(parameter)
+        arrays = GraphArrays.from_graph(algo.graph, parameter.disabled_nodes)
+        array_a_star(arrays, parameter)  # trigger compilation
+
+        runs = 200
+        t_start = time.perf_counter()
+        for _ in range(runs):
+            result = array_a_star(arrays, parameter)
+        t_array = (time.perf_counter() - t_start)/runs
+        t_python = float('inf')
+        for _ in range(5):
+            algo.reset_search(parameter)
+            t_start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                algo.full_run()
+            t_python = min(t_python, time.perf_counter() - t_start)
+        print(f'{width}x{height}: cost {result.cost}, A_star.full_run: {t_python*1e3:.3f} ms, '
+              f'array search: {t_array*1e3:.3f} ms, speedup {t_python/t_array:.1f}x')
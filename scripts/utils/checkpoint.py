@@ -0,0 +1,99 @@
+"""Checkpoints of a running A_star search.
+The search state (open list heap entries, closed list, g and parent of the reached nodes, current and
+reached node) is written together with the parameters into one uncompressed .npz file. Random edge weights
+are stored as well, all other graphs are rebuilt from the parameters. Only the nodes reached by the search
+are stored, the file grows with the search and not with the graph.
+A checkpoint is written to a temporary file first and renamed afterwards, an interrupted write never
+destroys the previous checkpoint.
+"""
+# standard lib
+from typing import TYPE_CHECKING
+import heapq
+import json
+import os
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.parameter import A_star_parameter
+if TYPE_CHECKING:
+    from utils.a_start_algorithm import A_star
+
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(algorithm: "A_star", path: str):
+    """Writes the search state of algorithm atomically to path (.npz)"""
+    parameter = algorithm.parameter
+    graph = algorithm.graph
+    # g and parent are only set for nodes which are or were in the open list
+    nodes = list(algorithm.open_list) + list(algorithm.closed_list)
+    # the valid heap entries with their tie-breaking keys, the resumed search pops them in the same order
+    entries = [entry for entry in algorithm.open_heap if algorithm._open_entries.get(entry[3]) == entry[2]]
+    state = {
+        "version": np.int64(CHECKPOINT_VERSION),
+        "parameter": np.array(json.dumps(parameter.to_dict())),
+        "node_count": np.int64(graph.number_of_nodes()),
+        "open_f": np.array([entry[0] for entry in entries], dtype=np.float64),
+        "open_tiebreak": np.array([entry[1] for entry in entries], dtype=np.float64),
+        "open_counter": np.array([entry[2] for entry in entries], dtype=np.int64),
+        "open": np.array([entry[3] for entry in entries], dtype=np.int64),
+        "pushes": np.int64(algorithm._pushes),
+        "closed": np.array(sorted(node._id for node in algorithm.closed_list), dtype=np.int64),
+        "node_ids": np.array([node._id for node in nodes], dtype=np.int64),
+        "g": np.array([node.g for node in nodes], dtype=np.float64),
+        # parent node id, 0 for none
+        "parent": np.array([node.parent._id if node.parent else 0 for node in nodes], dtype=np.int64),
+        "current": np.int64(algorithm.current_node._id if algorithm.current_node else 0),
+        "reached": np.int64(algorithm.reached_target._id if algorithm.reached_target else 0),
+    }
+    if isinstance(parameter.edge_weight, tuple) and not parameter.terrain:
+        edges = [(u._id, v._id, weight) for u, v, weight in graph.edges(data='weight')]
+        state["edge_start"] = np.array([edge[0] for edge in edges], dtype=np.int64)
+        state["edge_end"] = np.array([edge[1] for edge in edges], dtype=np.int64)
+        state["edge_weight"] = np.array([edge[2] for edge in edges], dtype=np.float64)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez(file, **state)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str) -> "A_star":
+    """Rebuilds the graph and the search state of a checkpoint, the search continues with the next step.
+    Raises:
+        ValueError: unknown checkpoint version or the graph does not match (e.g. changed terrain image)
+    """
+    from utils.a_start_algorithm import A_star
+
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != CHECKPOINT_VERSION:
+            raise ValueError(f'Checkpoint version {int(data["version"])} is not supported!')
+        parameter = A_star_parameter.from_dict(json.loads(str(data["parameter"])))
+        algorithm = A_star(parameter)
+        graph = algorithm.graph
+        if graph.number_of_nodes() != int(data["node_count"]):
+            raise ValueError(f'Checkpoint of {int(data["node_count"])} nodes does not match the graph with '
+                             f'{graph.number_of_nodes()} nodes!')
+        if "edge_weight" in data:
+            for u, v, weight in zip(data["edge_start"].tolist(), data["edge_end"].tolist(), data["edge_weight"].tolist()):
+                graph[graph.node_by_id(u)][graph.node_by_id(v)]['weight'] = weight
+
+        for node_id, g, parent_id in zip(data["node_ids"].tolist(), data["g"].tolist(), data["parent"].tolist()):
+            node = graph.node_by_id(node_id)
+            node.refresh()
+            node.g = g
+            node.parent = graph.node_by_id(parent_id) if parent_id else None
+        algorithm.open_heap = list(zip(data["open_f"].tolist(), data["open_tiebreak"].tolist(),
+                                       data["open_counter"].tolist(), data["open"].tolist()))
+        heapq.heapify(algorithm.open_heap)
+        algorithm._open_entries = {node_id: counter for _, _, counter, node_id in algorithm.open_heap}
+        algorithm._pushes = int(data["pushes"])
+        algorithm.closed_list = {graph.node_by_id(node_id) for node_id in data["closed"].tolist()}
+        current, reached = int(data["current"]), int(data["reached"])
+        algorithm.current_node = graph.node_by_id(current) if current else None
+        algorithm.reached_target = graph.node_by_id(reached) if reached else None
+    return algorithm
@@ -0,0 +1,320 @@
+"""Command line interface. Only the GUI command imports PyQt5, matplotlib and networkx,
+the headless commands run on the array based search engines with numpy.
+The resume command continues a checkpointed A_star search and needs networkx.
+
+Scenario file (JSON):
+    {
+        "graph": {"edge_weight": [2, 9], "width": 20, "height": 10, "seed": 0},  or {"terrain": "map.png"}
+        "queries": [{"start_node": 1, "target_node": 200, "h_scale": 1.0, "distance_method": "manhatten"}, ...]
+    }
+Every query accepts the keys of A_star_parameter.to_dict and "dijkstra": true, missing keys use the defaults.
+"""
+# standard lib
+from typing import TYPE_CHECKING, Optional, List, Iterator, TextIO
+from dataclasses import asdict
+import argparse
+import json
+import os
+import sys
+import time
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter, TIE_BREAKING_POLICIES
+if TYPE_CHECKING:
+    from utils.a_start_algorithm import A_star
+
+
+def load_scenario(path: str) -> dict:
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def scenario_arrays(scenario: dict) -> GraphArrays:
+    """Builds the graph of a scenario in array layout, a "terrain" image replaces the lattice"""
+    graph_config = dict(scenario.get("graph", {}))
+    if graph_config.get("terrain"):
+        from utils.terrain import terrain_arrays
+        return terrain_arrays(graph_config["terrain"])
+    if isinstance(graph_config.get("edge_weight"), list):
+        graph_config["edge_weight"] = tuple(graph_config["edge_weight"])
+    return GraphArrays.lattice(**graph_config)
+
+
+def solve_queries(arrays: GraphArrays, queries: List[dict]) -> Iterator[dict]:
+    """Runs the queries one after another and yields one result dict per query"""
+    from utils.array_search import array_a_star
+
+    for number, query in enumerate(queries):
+        query = dict(query)
+        dijkstra = bool(query.pop("dijkstra", False))
+        parameter = A_star_parameter.from_dict(query)
+        t_start = time.perf_counter()
+        result = array_a_star(arrays, parameter, dijkstra)
+        runtime = time.perf_counter() - t_start
+        line = {"query": number, "start_node": parameter.start_node}
+        line.update(asdict(result))
+        line["runtime"] = runtime
+        yield line
+
+
+def write_jsonl(lines: Iterator[dict], out: TextIO):
+    """Writes every line as soon as it is available"""
+    for line in lines:
+        out.write(json.dumps(line) + "\n")
+        out.flush()
+
+
+def run_gui():
+    from PyQt5.QtWidgets import QApplication
+    from utils.main_window import MainWindow
+
+    app = QApplication([])
+    window = MainWindow()
+    window.showMaximized()
+    window.show()
+    app.exec_()
+
+
+def command_solve(args: argparse.Namespace):
+    scenario = load_scenario(args.scenario)
+    arrays = scenario_arrays(scenario)
+    lines = solve_queries(arrays, scenario.get("queries", []))
+    if args.out == "-":
+        write_jsonl(lines, sys.stdout)
+    else:
+        with open(args.out, "w") as out:
+            write_jsonl(lines, out)
+
+
+def command_export(args: argparse.Namespace):
+    from utils.array_search import record_search
+    from utils.animation_export import export_animation
+    import utils.constants as const
+
+    scenario = load_scenario(args.scenario)
+    arrays = scenario_arrays(scenario)
+    query = dict(scenario.get("queries", [{}])[args.query])
+    dijkstra = bool(query.pop("dijkstra", False))
+    recording = record_search(arrays, A_star_parameter.from_dict(query), dijkstra)
+    graph_config = scenario.get("graph", {})
+    width, height = graph_config.get("width", const.GRID_WIDTH), graph_config.get("height", const.GRID_HEIGHT)
+    if graph_config.get("terrain"):
+        from utils.terrain import load_terrain
+        height, width = load_terrain(graph_config["terrain"]).shape
+    frames = export_animation(recording, width, height, args.out, every=args.every, fps=args.fps,
+                              frame_width=args.frame_width, workers=args.workers)
+    print(f"{frames} frames of {recording.step_count} steps exported to {args.out}")
+
+
+def scenario_parameter(scenario: dict, query_number: int = 0) -> A_star_parameter:
+    """Parameters of one query of a scenario including its graph, for the networkx based A_star"""
+    graph_config = scenario.get("graph", {})
+    values = dict(scenario.get("queries", [{}])[query_number])
+    values.pop("dijkstra", None)
+    for key, name in (("edge_weight", "edge_weight"), ("width", "grid_width"), ("height", "grid_height"), ("terrain", "terrain")):
+        if key in graph_config:
+            values[name] = graph_config[key]
+    if graph_config.get("terrain"):
+        from utils.terrain import load_terrain
+        values["grid_height"], values["grid_width"] = load_terrain(graph_config["terrain"]).shape
+    return A_star_parameter.from_dict(values)
+
+
+def scenario_algorithm(scenario: dict, query_number: int = 0) -> "A_star":
+    """A_star of one query of a scenario on the same graph as scenario_arrays.
+    Random lattice weights are only drawn in GraphArrays.lattice, every command searches the same graph.
+    """
+    from utils.a_start_algorithm import A_star
+
+    algorithm = A_star(scenario_parameter(scenario, query_number))
+    if not scenario.get("graph", {}).get("terrain"):
+        algorithm.graph.set_edge_weights(scenario_arrays(scenario))
+    return algorithm
+
+
+def command_resume(args: argparse.Namespace):
+    from utils.a_start_algorithm import A_star
+
+    if os.path.exists(args.checkpoint):
+        algorithm = A_star.from_checkpoint(args.checkpoint)
+        print(f"resuming {args.checkpoint} after {algorithm.expansions} expansions", file=sys.stderr)
+    elif args.scenario:
+        algorithm = scenario_algorithm(load_scenario(args.scenario), args.query)
+    else:
+        sys.exit(f"Checkpoint {args.checkpoint} does not exist, give a --scenario to start a new search!")
+    algorithm.checkpoint_path = args.checkpoint
+    algorithm.checkpoint_every = args.every
+    t_start = time.perf_counter()
+    try:
+        reached = algorithm.reached_target is not None or algorithm.full_run()
+    except KeyboardInterrupt:
+        algorithm.save_checkpoint()
+        print(f"interrupted after {algorithm.expansions} expansions, saved to {args.checkpoint}", file=sys.stderr)
+        sys.exit(130)
+    algorithm.save_checkpoint()
+    print(json.dumps({"reached": reached, "cost": algorithm.reached_target.g if reached else None,
+                      "path": algorithm.get_path(), "expansions": algorithm.expansions,
+                      "runtime": time.perf_counter() - t_start}))
+
+
+def command_ch(args: argparse.Namespace):
+    from utils.contraction_hierarchies import benchmark
+
+    scenario = load_scenario(args.scenario)
+    algorithm = scenario_algorithm(scenario, args.query)
+    report = benchmark(algorithm.parameter, args.queries, args.seed, args.hierarchy, algorithm)
+    print(json.dumps(report, indent=2))
+
+
+def command_verify(args: argparse.Namespace):
+    from utils.differential_harness import run_harness, summarize, failures, VERIFY_COLUMNS
+    from utils.parameter_sweep import write_table
+
+    rows = run_harness(args.count, args.seed, args.engines, min_size=args.min_size, max_size=args.max_size,
+                       max_obstacle_density=args.max_obstacle_density)
+    if args.out:
+        write_table(rows, args.out, VERIFY_COLUMNS)
+    for engine, summary in summarize(rows).items():
+        print(engine, json.dumps(summary))
+    failed = failures(rows)
+    for row in failed:
+        print("FAILED", json.dumps(row), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def command_serve(args: argparse.Namespace):
+    import asyncio
+    from utils.path_service import serve
+
+    scenario = load_scenario(args.scenario) if args.scenario else {}
+    arrays = scenario_arrays(scenario)
+    try:
+        asyncio.run(serve(arrays, args.host, args.port, args.unix_socket, args.workers, args.queue_size, args.threads))
+    except KeyboardInterrupt:
+        pass
+
+
+def command_loadgen(args: argparse.Namespace):
+    import asyncio
+    from utils.load_generator import run_load
+
+    report = asyncio.run(run_load(args.host, args.port, args.unix_socket, args.connections, args.requests,
+                                  args.duration, args.pool_size, args.seed))
+    print(json.dumps(report, indent=2))
+
+
+def _edge_weight(text: str):
+    """'2' is a fixed weight, '2,9' random integer weights between 2 and 9"""
+    values = [float(value) for value in text.split(",")]
+    return values[0] if len(values) == 1 else tuple(int(value) for value in values)
+
+
+def command_sweep(args: argparse.Namespace):
+    from utils.parameter_sweep import parameter_grid, run_sweep, write_table, plot_summary
+
+    scenarios = [load_scenario(path) for path in args.scenario]
+    values = {}
+    if args.h_scale:
+        values["h_scale"] = args.h_scale
+    if args.distance_method:
+        values["distance_method"] = args.distance_method
+    if args.edge_weight:
+        values["edge_weight"] = [_edge_weight(text) for text in args.edge_weight]
+    if args.tie_breaking:
+        values["tie_breaking"] = args.tie_breaking
+    t_start = time.perf_counter()
+    rows = run_sweep(scenarios, parameter_grid(**values), workers=args.workers, repeat=args.repeat)
+    write_table(rows, args.out)
+    if args.plot:
+        plot_summary(rows, args.plot)
+    print(f"{len(rows)} runs in {time.perf_counter() - t_start:.1f} s written to {args.out}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="a_star_viz", description="A* visualization and headless path search")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("gui", help="start the Qt application (default)")
+
+    solve_parser = subparsers.add_parser("solve", help="run the queries of a scenario file without GUI")
+    solve_parser.add_argument("--scenario", required=True, help="scenario JSON file")
+    solve_parser.add_argument("--out", default="-", help="JSONL result file, '-' for stdout")
+    solve_parser.set_defaults(func=command_solve)
+
+    export_parser = subparsers.add_parser("export", help="render a search of a scenario off-screen as video, GIF or PNG sequence")
+    export_parser.add_argument("--scenario", required=True, help="scenario JSON file")
+    export_parser.add_argument("--query", type=int, default=0, help="number of the exported query")
+    export_parser.add_argument("--out", required=True, help="video/GIF file (needs ffmpeg) or directory for PNG frames")
+    export_parser.add_argument("--every", type=int, default=1, help="render every Nth step")
+    export_parser.add_argument("--fps", type=int, default=25)
+    export_parser.add_argument("--frame-width", type=int, default=800, help="frame width in pixel")
+    export_parser.add_argument("--workers", type=int, default=None, help="rendering processes, default CPU count")
+    export_parser.set_defaults(func=command_export)
+
+    sweep_parser = subparsers.add_parser("sweep", help="run a grid of parameter values on scenarios and tabulate the results")
+    sweep_parser.add_argument("--scenario", required=True, nargs="+", help="scenario JSON files")
+    sweep_parser.add_argument("--h-scale", type=float, nargs="+", help="h_scale values")
+    sweep_parser.add_argument("--distance-method", nargs="+", help="distance functions, e.g. euclidian manhatten")
+    sweep_parser.add_argument("--edge-weight", nargs="+", help="edge weights, '2' fixed or '2,9' random range")
+    sweep_parser.add_argument("--tie-breaking", nargs="+", choices=TIE_BREAKING_POLICIES, help="order of nodes with equal f")
+    sweep_parser.add_argument("--out", required=True, help="result table, .csv or .parquet (needs pandas)")
+    sweep_parser.add_argument("--plot", default=None, help="image file of the summary plot")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="processes, default CPU count")
+    sweep_parser.add_argument("--repeat", type=int, default=3, help="runs per combination, the fastest is reported")
+    sweep_parser.set_defaults(func=command_sweep)
+
+    resume_parser = subparsers.add_parser("resume", help="run an A_star search with checkpoints or continue it from its checkpoint")
+    resume_parser.add_argument("--checkpoint", required=True, help="checkpoint file (.npz), continued if it exists")
+    resume_parser.add_argument("--scenario", default=None, help="scenario JSON file of a new search")
+    resume_parser.add_argument("--query", type=int, default=0, help="number of the query of a new search")
+    resume_parser.add_argument("--every", type=int, default=10000, help="expansions between two checkpoints, 0 only at the end")
+    resume_parser.set_defaults(func=command_resume)
+
+    ch_parser = subparsers.add_parser("ch", help="preprocess a contraction hierarchy and compare its queries with A_star")
+    ch_parser.add_argument("--scenario", required=True, help="scenario JSON file, graph and disabled nodes of --query")
+    ch_parser.add_argument("--query", type=int, default=0, help="query with the parameters of the comparison")
+    ch_parser.add_argument("--hierarchy", default=None, help="hierarchy file (.npz), loaded if it exists, written otherwise")
+    ch_parser.add_argument("--queries", type=int, default=20, help="random queries of the comparison")
+    ch_parser.add_argument("--seed", type=int, default=0, help="seed of the random queries")
+    ch_parser.set_defaults(func=command_ch)
+
+    verify_parser = subparsers.add_parser("verify", help="check all engines against the networkx reference on random scenarios")
+    verify_parser.add_argument("--count", type=int, default=50, help="number of random scenarios")
+    verify_parser.add_argument("--seed", type=int, default=0, help="seed of the first scenario")
+    verify_parser.add_argument("--engines", nargs="+", default=None, help="engines to run, default all")
+    verify_parser.add_argument("--min-size", type=int, default=5, help="minimal grid width/height")
+    verify_parser.add_argument("--max-size", type=int, default=30, help="maximal grid width/height")
+    verify_parser.add_argument("--max-obstacle-density", type=float, default=0.3, help="maximal share of disabled nodes")
+    verify_parser.add_argument("--out", default=None, help="result table, .csv or .parquet (needs pandas)")
+    verify_parser.set_defaults(func=command_verify)
+
+    serve_parser = subparsers.add_parser("serve", help="answer path queries over local HTTP (see utils.path_service)")
+    serve_parser.add_argument("--scenario", default=None, help="scenario JSON file of the graph, default lattice otherwise")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--unix-socket", default=None, help="listen on a unix socket instead of TCP")
+    serve_parser.add_argument("--workers", type=int, default=4, help="executor workers")
+    serve_parser.add_argument("--queue-size", type=int, default=256, help="queued queries before requests are rejected with 503")
+    serve_parser.add_argument("--threads", action="store_true", help="thread pool instead of process pool")
+    serve_parser.set_defaults(func=command_serve)
+
+    loadgen_parser = subparsers.add_parser("loadgen", help="load test a running path query service")
+    loadgen_parser.add_argument("--host", default="127.0.0.1")
+    loadgen_parser.add_argument("--port", type=int, default=8080)
+    loadgen_parser.add_argument("--unix-socket", default=None)
+    loadgen_parser.add_argument("--connections", type=int, default=32, help="concurrent connections")
+    loadgen_parser.add_argument("--requests", type=int, default=10000, help="total requests")
+    loadgen_parser.add_argument("--duration", type=float, default=30.0, help="maximal duration in seconds")
+    loadgen_parser.add_argument("--pool-size", type=int, default=100, help="distinct queries, smaller pools coalesce more")
+    loadgen_parser.add_argument("--seed", type=int, default=0)
+    loadgen_parser.set_defaults(func=command_loadgen)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    if args.command in (None, "gui"):
+        run_gui()
+    else:
+        args.func(args)
@@ -26,6 +26,11 @@ NODE_EDGE_COLOR_TARGET = "grey"
 # Disabled node
 NODE_COLOR_DISABLE = "black"
 NODE_EDGE_COLOR_DISABLE = "black"
+# Distance heatmap
+HEATMAP_CMAP = "viridis"
+NODE_COLOR_UNREACHED = "white"
+# Cooperative multi-agent paths, one color per agent
+AGENT_CMAP = "tab10"
 
 
 # unified values
@@ -33,8 +38,32 @@ NODE_SIZE = 500
 EDGE_COLOR = "black"
 NODE_EDGE_WIDTH = 2.0
 
+# Large graphs: raster image of the node states, markers and labels only for the visible nodes
+LARGE_GRAPH_NODE_COUNT = 1000
+LOD_MARKER_NODE_LIMIT = 2500
+LOD_LABEL_NODE_LIMIT = 150
+SCROLL_ZOOM_FACTOR = 0.8
+
+#####################
+# Graph layout
+#####################
+GRID_WIDTH = 20
+GRID_HEIGHT = 10
+# lattices are built node by node in networkx, 500x500 takes about 14 s and 300 MB
+GRID_SIZE_MAX = 500
+# terrain images use the array layout and create their nodes lazily
+TERRAIN_SIZE_MAX = 10000
+
 #####################
 # Algorithm Parameter
 #####################
 EDGE_WEIGHT = 2#random.randint(2, 5)
 H_SCALE = 1.4
+# order of open nodes with equal f, see parameter.TIE_BREAKING_POLICIES
+TIE_BREAKING = "high_g"
+# expansion cap of IDA*/SMA* per graph node if no max_expansions is given
+MEMORY_BOUNDED_EXPANSIONS_PER_NODE = 50
+# weight decrease between two anytime (ARA*) iterations
+ARA_WEIGHT_STEP = 0.2
+# cooperative horizon in time steps of the multi-agent run, 0 plans the complete paths at once
+COOPERATIVE_WINDOW = 0
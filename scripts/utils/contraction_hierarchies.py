@@ -0,0 +1,355 @@
+"""Contraction Hierarchies (Geisberger et al. 2008) for many queries on a static graph.
+Preprocessing contracts the nodes one after another in the order of their edge difference. A shortcut
+replaces the path u - v - w of a contracted node v unless a witness search finds a path from u to w
+which is not longer. Every node keeps only the edges to the nodes contracted after it (upward edges),
+a query runs Dijkstra upwards from the start and from the target and meets at the highest node of the
+shortest path. Shortcuts remember their middle node and are unpacked into the original path.
+The graph is undirected, the same upward graph serves the forward and the backward search.
+"""
+# standard lib
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+from dataclasses import dataclass, field
+import heapq
+import time
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.array_search import _jit, SearchResult
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter
+if TYPE_CHECKING:
+    from utils.a_start_algorithm import A_star
+
+# settled nodes of one witness search, a search stopped at the limit adds the shortcut (never wrong, maybe superfluous)
+WITNESS_SETTLE_LIMIT = 100
+
+
+@dataclass
+class ContractionHierarchy:
+    """Upward graph in CSR layout: the edges of node index i to higher ranked nodes are
+    indices[indptr[i]:indptr[i+1]], middle is the contracted node of a shortcut and -1 for original edges.
+    """
+    rank: np.ndarray        # (n,) int64 contraction order
+    indptr: np.ndarray      # (n + 1,) int64
+    indices: np.ndarray     # (m,) int64
+    weights: np.ndarray     # (m,) float64
+    middle: np.ndarray      # (m,) int64
+    disabled: np.ndarray    # (n,) bool, disabled nodes of the preprocessed graph, they have no edges
+    preprocessing_time: float = 0.0
+    edge_source: np.ndarray = field(init=False, repr=False)  # (m,) lower node index of every upward edge
+
+    def __post_init__(self):
+        self.edge_source = np.repeat(np.arange(self.rank.shape[0]), np.diff(self.indptr))
+
+    @property
+    def node_count(self) -> int:
+        return self.rank.shape[0]
+
+    @property
+    def shortcut_count(self) -> int:
+        return int(np.count_nonzero(self.middle >= 0))
+
+    @property
+    def nbytes(self) -> int:
+        """Memory footprint of the arrays in bytes"""
+        arrays = (self.rank, self.indptr, self.indices, self.weights, self.middle, self.disabled, self.edge_source)
+        return sum(array.nbytes for array in arrays)
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            np.savez(file, rank=self.rank, indptr=self.indptr, indices=self.indices, weights=self.weights,
+                     middle=self.middle, disabled=self.disabled, preprocessing_time=self.preprocessing_time)
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["rank"], data["indptr"], data["indices"], data["weights"], data["middle"],
+                       data["disabled"], float(data["preprocessing_time"]))
+
+    def query(self, start_node: int, target_node: int) -> SearchResult:
+        """Shortest path between two node ids, expansions are the settled nodes of both directions"""
+        start, target = GraphArrays.index_of(start_node), GraphArrays.index_of(target_node)
+        if self.disabled[start] or self.disabled[target]:
+            return SearchResult(False)
+        cost, meet, parent_edge, expansions = _query_kernel(self.indptr, self.indices, self.weights, start, target)
+        if meet == -1:
+            return SearchResult(False, expansions=int(expansions))
+        path = _unpack_kernel(self.indptr, self.indices, self.middle, self.edge_source, parent_edge, meet)
+        return SearchResult(True, (path + 1).tolist(), float(cost), int(expansions), target_node)
+
+
+@_jit
+def _query_kernel(indptr, indices, weights, start, target):
+    node_count = indptr.shape[0] - 1
+    dist = np.full((2, node_count), np.inf)
+    parent_edge = np.full((2, node_count), -1, dtype=np.int64)
+    dist[0, start] = 0.0
+    dist[1, target] = 0.0
+    forward_heap = [(0.0, start)]
+    backward_heap = [(0.0, target)]
+    best = np.inf
+    meet = -1
+    expansions = 0
+    while len(forward_heap) > 0 or len(backward_heap) > 0:
+        # the direction with the smaller key, a direction is done when its key reaches the best cost
+        direction = 0
+        if len(forward_heap) == 0 or (len(backward_heap) > 0 and backward_heap[0][0] < forward_heap[0][0]):
+            direction = 1
+        heap = backward_heap if direction == 1 else forward_heap
+        d, node = heapq.heappop(heap)
+        if d >= best:
+            heap.clear()
+            continue
+        if d > dist[direction, node]:
+            # stale heap entry
+            continue
+        expansions += 1
+        if d + dist[1 - direction, node] < best:
+            best = d + dist[1 - direction, node]
+            meet = node
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[k]
+            neighbour_d_new = d + weights[k]
+            if neighbour_d_new < dist[direction, neighbour]:
+                dist[direction, neighbour] = neighbour_d_new
+                parent_edge[direction, neighbour] = k
+                heapq.heappush(heap, (neighbour_d_new, neighbour))
+    return best, meet, parent_edge, expansions
+
+
+@_jit
+def _unpack_kernel(indptr, indices, middle, edge_source, parent_edge, meet):
+    """Original node indices from the start to the target of the search trees which meet at meet"""
+    # upward edges as (from, to, edge) in path order: start up to meet, then meet down to the target
+    forward = []
+    node = meet
+    while parent_edge[0, node] != -1:
+        k = parent_edge[0, node]
+        forward.append((edge_source[k], node, k))
+        node = edge_source[k]
+    path = [node]
+    edges = forward[::-1]
+    node = meet
+    while parent_edge[1, node] != -1:
+        k = parent_edge[1, node]
+        edges.append((node, edge_source[k], k))
+        node = edge_source[k]
+    for edge in edges:
+        stack = [edge]
+        while len(stack) > 0:
+            a, b, k = stack.pop()
+            m = middle[k]
+            if m == -1:
+                path.append(b)
+                continue
+            # m is ranked below a and b, both halves are upward edges of m. a - m first.
+            for j in range(indptr[m], indptr[m + 1]):
+                if indices[j] == b:
+                    stack.append((m, b, j))
+            for j in range(indptr[m], indptr[m + 1]):
+                if indices[j] == a:
+                    stack.append((a, m, j))
+    return np.array(path, dtype=np.int64)
+
+
+def _witness_distances(adjacency: List[Dict[int, Tuple[float, int]]], source: int, excluded: int,
+                       targets: Dict[int, float], cutoff: float, settle_limit: int) -> Dict[int, float]:
+    """Dijkstra from source around the excluded node, ends when all targets are settled or cutoff is exceeded"""
+    dist = {source: 0.0}
+    settled = set()
+    targets_left = len(targets)
+    open_heap = [(0.0, source)]
+    while open_heap and len(settled) < settle_limit:
+        d, node = heapq.heappop(open_heap)
+        if node in settled:
+            continue
+        if d > cutoff:
+            break
+        settled.add(node)
+        if node in targets:
+            targets_left -= 1
+            if targets_left == 0:
+                break
+        for neighbour, (weight, _) in adjacency[node].items():
+            if neighbour == excluded or neighbour in settled:
+                continue
+            if d + weight < dist.get(neighbour, float('inf')):
+                dist[neighbour] = d + weight
+                heapq.heappush(open_heap, (d + weight, neighbour))
+    return dist
+
+
+def _shortcuts(adjacency: List[Dict[int, Tuple[float, int]]], node: int, settle_limit: int) -> List[Tuple[int, int, float]]:
+    """Shortcuts (u, w, cost) needed if node is contracted now"""
+    neighbours = [(neighbour, weight) for neighbour, (weight, _) in adjacency[node].items()]
+    shortcuts = []
+    for i, (u, weight_u) in enumerate(neighbours):
+        # every unordered pair once, the graph is undirected
+        targets = {w: weight_u + weight_w for w, weight_w in neighbours[i + 1:]}
+        if not targets:
+            continue
+        dist = _witness_distances(adjacency, u, node, targets, max(targets.values()), settle_limit)
+        shortcuts.extend((u, w, via) for w, via in targets.items() if dist.get(w, float('inf')) > via)
+    return shortcuts
+
+
+def build_contraction_hierarchy(arrays: GraphArrays, settle_limit: int = WITNESS_SETTLE_LIMIT) -> ContractionHierarchy:
+    """Contracts all nodes of the graph. Disabled nodes are removed from the graph, queries have to use
+    the same disabled nodes.
+    Priority of a node: shortcuts it needs - its edges + its contracted neighbours (spreads the
+    contraction over the graph). Priorities are updated for the neighbours of a contracted node and
+    lazily when a node is popped.
+    Args:
+        arrays: graph in array layout, e.g. GraphArrays.from_graph(A_star(parameter).graph, parameter.disabled_nodes)
+        settle_limit: settled nodes per witness search
+    Returns:
+        ContractionHierarchy: upward graph with shortcuts
+    """
+    t_start = time.perf_counter()
+    node_count = arrays.node_count
+    adjacency: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(node_count)]
+    for node in np.flatnonzero(~arrays.disabled).tolist():
+        for k in range(arrays.indptr[node], arrays.indptr[node + 1]):
+            neighbour = int(arrays.indices[k])
+            if not arrays.disabled[neighbour]:
+                weight = float(arrays.weights[k])
+                if weight < adjacency[node].get(neighbour, (float('inf'), -1))[0]:
+                    adjacency[node][neighbour] = (weight, -1)
+
+    contracted_neighbours = np.zeros(node_count, dtype=np.int64)
+
+    def priority(node: int) -> Tuple[int, List[Tuple[int, int, float]]]:
+        shortcuts = _shortcuts(adjacency, node, settle_limit)
+        return len(shortcuts) - len(adjacency[node]) + int(contracted_neighbours[node]), shortcuts
+
+    priorities = np.array([priority(node)[0] for node in range(node_count)], dtype=np.int64)
+    open_heap = list(zip(priorities.tolist(), range(node_count)))
+    heapq.heapify(open_heap)
+    rank = np.full(node_count, -1, dtype=np.int64)
+    upward: List[List[Tuple[int, float, int]]] = [[] for _ in range(node_count)]
+    next_rank = 0
+    while open_heap:
+        value, node = heapq.heappop(open_heap)
+        if rank[node] != -1 or value != priorities[node]:
+            # contracted or stale heap entry
+            continue
+        # lazy update: contract only if the node is still the best one
+        value, shortcuts = priority(node)
+        if open_heap and value > open_heap[0][0]:
+            priorities[node] = value
+            heapq.heappush(open_heap, (value, node))
+            continue
+        rank[node] = next_rank
+        next_rank += 1
+        neighbours = list(adjacency[node])
+        upward[node] = [(neighbour, weight, middle) for neighbour, (weight, middle) in adjacency[node].items()]
+        for neighbour in neighbours:
+            del adjacency[neighbour][node]
+            contracted_neighbours[neighbour] += 1
+        adjacency[node] = {}
+        for u, w, cost in shortcuts:
+            if cost < adjacency[u].get(w, (float('inf'), -1))[0]:
+                adjacency[u][w] = (cost, node)
+                adjacency[w][u] = (cost, node)
+        for neighbour in neighbours:
+            priorities[neighbour] = priority(neighbour)[0]
+            heapq.heappush(open_heap, (int(priorities[neighbour]), neighbour))
+
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum([len(edges) for edges in upward], out=indptr[1:])
+    edges = [edge for node_edges in upward for edge in node_edges]
+    return ContractionHierarchy(rank, indptr,
+                                np.array([edge[0] for edge in edges], dtype=np.int64),
+                                np.array([edge[1] for edge in edges], dtype=np.float64),
+                                np.array([edge[2] for edge in edges], dtype=np.int64),
+                                arrays.disabled.copy(), time.perf_counter() - t_start)
+
+
+def ch_a_star(hierarchy: ContractionHierarchy, parameter: A_star_parameter) -> SearchResult:
+    """Counterpart of array_a_star on a contraction hierarchy, the heuristic parameters are not needed.
+    With several target nodes the cheapest one is returned.
+    The nodes disabled at preprocessing (e.g. blocked terrain cells) stay blocked.
+    Raises:
+        ValueError: a disabled node of the parameters was not disabled at preprocessing
+    """
+    disabled = np.zeros(hierarchy.node_count, dtype=np.bool_)
+    disabled[[GraphArrays.index_of(node_id) for node_id in parameter.disabled_nodes]] = True
+    if np.any(disabled & ~hierarchy.disabled):
+        raise ValueError('The contraction hierarchy was built without the disabled nodes of the query!')
+    best = SearchResult(False)
+    for target_node in parameter.all_target_nodes:
+        result = hierarchy.query(parameter.start_node, target_node)
+        best.expansions += result.expansions
+        if result.reached and result.cost < best.cost:
+            best = SearchResult(True, result.path, result.cost, best.expansions, target_node)
+    return best
+
+
+def benchmark(parameter: A_star_parameter, queries: int = 20, seed: int = 0, hierarchy_path: Optional[str] = None,
+              algorithm: Optional["A_star"] = None) -> dict:
+    """Preprocessing time, shortcut count, memory and the query speedup vs. A_star.full_run
+    on random queries of the graph of parameter.
+    Args:
+        hierarchy_path: hierarchy file, loaded if it exists (it has to belong to the same graph), written otherwise
+        algorithm: A_star on the graph of parameter, e.g. with the weights of a scenario, built if None
+    """
+    import contextlib
+    import io
+    import os
+    import random
+    from utils.a_start_algorithm import A_star
+
+    if algorithm is None:
+        algorithm = A_star(parameter)
+    arrays = GraphArrays.from_graph(algorithm.graph, parameter.disabled_nodes)
+    if hierarchy_path and os.path.exists(hierarchy_path):
+        hierarchy = ContractionHierarchy.load(hierarchy_path)
+        if hierarchy.node_count != arrays.node_count:
+            raise ValueError(f'Hierarchy of {hierarchy.node_count} nodes does not match the graph with {arrays.node_count} nodes!')
+    else:
+        hierarchy = build_contraction_hierarchy(arrays)
+        if hierarchy_path:
+            hierarchy.save(hierarchy_path)
+    hierarchy.query(parameter.start_node, parameter.target_node)  # compiles/loads the query kernel
+    rng = random.Random(seed)
+    enabled = (np.flatnonzero(~arrays.disabled) + 1).tolist()
+    ch_time, a_star_time, ch_expansions, a_star_expansions = 0.0, 0.0, 0, 0
+    for _ in range(queries):
+        start, target = rng.sample(enabled, 2)
+        query = parameter.copy()
+        query.start_node, query.target_node, query.additional_target_nodes = start, target, []
+        t_start = time.perf_counter()
+        result = ch_a_star(hierarchy, query)
+        ch_time += time.perf_counter() - t_start
+        ch_expansions += result.expansions
+        algorithm.reset_search(query)
+        t_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            algorithm.full_run()
+        a_star_time += time.perf_counter() - t_start
+        a_star_expansions += algorithm.expansions
+    return {
+        "nodes": hierarchy.node_count,
+        "edges": arrays.edge_count,
+        "preprocessing_time": hierarchy.preprocessing_time,
+        "shortcuts": hierarchy.shortcut_count,
+        "memory_bytes": hierarchy.nbytes,
+        "queries": queries,
+        "ch_query_time": ch_time/queries,
+        "a_star_query_time": a_star_time/queries,
+        "speedup": a_star_time/ch_time if ch_time > 0 else None,
+        "ch_expansions": ch_expansions/queries,
+        "a_star_expansions": a_star_expansions/queries,
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    from utils.geometry import ManhattenDistance
+
+    parameter = A_star_parameter(distance_method=ManhattenDistance(), h_scale=1.0, edge_weight=(2, 9),
+                                 grid_width=60, grid_height=60)
+    print(json.dumps(benchmark(parameter), indent=2))
@@ -0,0 +1,233 @@
+"""Cooperative A* for several agents on one graph (Silver 2005).
+The agents are planned one after another in (node, time) space. Every planned path is entered into a
+space-time reservation table, later agents avoid the reserved vertices and swaps. Every move and every
+wait takes one time step. With a window only the next window steps are planned cooperatively
+(windowed hierarchical cooperative A*), the agents are replanned window by window in rotating order.
+"""
+# standard lib
+from typing import List, Optional, Set, Dict, Tuple
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import time
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.array_search import distance_field
+from utils.graph_arrays import GraphArrays
+
+
+@dataclass
+class AgentPlan:
+    agent: int
+    start_node: int
+    target_node: int
+    reached: bool = False
+    failed: bool = False                            # no collision free plan was found, the agent waited in place
+    path: List[int] = field(default_factory=list)  # node id per time step, starting at time 0
+    cost: float = 0.0                               # edge weights plus wait costs
+    expansions: int = 0
+    runtime: float = 0.0
+
+
+@dataclass
+class CooperativeResult:
+    plans: List[AgentPlan]
+    wall_time: float
+    rounds: int
+    conflicts: int = 0  # vertex and swap conflicts of the returned paths, see count_conflicts
+
+    @property
+    def makespan(self) -> int:
+        return max((len(plan.path) - 1 for plan in self.plans), default=0)
+
+    @property
+    def total_cost(self) -> float:
+        return sum(plan.cost for plan in self.plans)
+
+    @property
+    def total_expansions(self) -> int:
+        return sum(plan.expansions for plan in self.plans)
+
+
+class ReservationTable():
+    """Space-time reservations packed into integers.
+    Vertex key: t*n + index, move key: (t*n + from)*n + to for a move which starts at time t.
+    An agent parked at its target blocks the vertex from its arrival time on.
+    """
+
+    def __init__(self, node_count: int):
+        self.node_count = node_count
+        self.vertices: Set[int] = set()
+        self.moves: Set[int] = set()
+        self.parked = np.full(node_count, np.iinfo(np.int64).max, dtype=np.int64)
+        self.last_reserved = np.full(node_count, -1, dtype=np.int64)
+
+    def vertex_free(self, index: int, t: int) -> bool:
+        return t < self.parked[index] and t*self.node_count + index not in self.vertices
+
+    def move_free(self, index: int, neighbour: int, t: int) -> bool:
+        """Move from index to neighbour between t and t + 1, blocked by the opposite move (swap)"""
+        return (t*self.node_count + neighbour)*self.node_count + index not in self.moves
+
+    def can_stay(self, index: int, t: int) -> bool:
+        """True if an agent can stay at index from time t on forever"""
+        return t > self.last_reserved[index] and t < self.parked[index]
+
+    def reserve(self, path: List[int], start_time: int = 0, park: bool = False):
+        """Reserves a path of node indices, one per time step from start_time on"""
+        n = self.node_count
+        for step, index in enumerate(path):
+            t = start_time + step
+            self.vertices.add(t*n + index)
+            self.last_reserved[index] = max(self.last_reserved[index], t)
+            if step > 0 and path[step - 1] != index:
+                self.moves.add(((t - 1)*n + path[step - 1])*n + index)
+        if park and path:
+            self.parked[path[-1]] = min(self.parked[path[-1]], start_time + len(path) - 1)
+
+
+def _plan_agent(arrays: GraphArrays, table: ReservationTable, h: np.ndarray, start: int, target: int,
+                start_time: int, window: Optional[int], wait_cost: float, max_time: int) -> Tuple[Optional[List[int]], float, int]:
+    """A* over (node, time) states which avoids the reserved vertices and moves.
+    Without window the search ends at the target once the agent can stay there, with window at the
+    end of the window (the exact distance h estimates the rest).
+    Returns:
+        (path of node indices per time step or None, cost, expansions)
+    """
+    n = arrays.node_count
+    indptr, indices, weights, disabled = arrays.indptr, arrays.indices, arrays.weights, arrays.disabled
+    start_key = start_time*n + start
+    g: Dict[int, float] = {start_key: 0.0}
+    parent: Dict[int, int] = {}
+    closed: Set[int] = set()
+    counter = itertools.count()
+    # ties: the later state first, it is closer to the end
+    open_heap = [(h[start], -start_time, next(counter), start_key)]
+    expansions = 0
+    while open_heap:
+        _, _, _, key = heapq.heappop(open_heap)
+        if key in closed:
+            continue
+        closed.add(key)
+        expansions += 1
+        t, index = divmod(key, n)
+        if (window is not None and t - start_time >= window) or (window is None and index == target and table.can_stay(index, t)):
+            cost = g[key]
+            path = [index]
+            while key in parent:
+                key = parent[key]
+                path.append(key % n)
+            return path[::-1], cost, expansions
+        if t >= max_time:
+            continue
+        cooperative = window is None or t + 1 - start_time <= window
+        # successors: all neighbours and waiting at the current node
+        moves = [(int(indices[k]), float(weights[k])) for k in range(indptr[index], indptr[index + 1])]
+        moves.append((index, 0.0 if index == target else wait_cost))
+        for neighbour, cost in moves:
+            if disabled[neighbour] or not np.isfinite(h[neighbour]):
+                continue
+            if cooperative and not (table.vertex_free(neighbour, t + 1) and table.move_free(index, neighbour, t)):
+                continue
+            neighbour_key = key + n - index + neighbour
+            neighbour_g = g[key] + cost
+            if neighbour_g < g.get(neighbour_key, float('inf')):
+                g[neighbour_key] = neighbour_g
+                parent[neighbour_key] = key
+                heapq.heappush(open_heap, (neighbour_g + h[neighbour], -(t + 1), next(counter), neighbour_key))
+    return None, float('inf'), expansions
+
+
+def cooperative_a_star(arrays: GraphArrays, agents: List[Tuple[int, int]], window: Optional[int] = None,
+                       wait_cost: Optional[float] = None, max_time: Optional[int] = None) -> CooperativeResult:
+    """Plans collision free paths for several agents.
+    Args:
+        arrays: graph in array layout, disabled nodes are blocked for all agents
+        agents: (start node id, target node id) per agent, earlier agents have priority
+        window: cooperative horizon in time steps, None plans the complete paths at once
+        wait_cost: cost of waiting one time step, default smallest edge weight. Waiting at the target is free.
+        max_time: latest time step of a path, default 4 * node count
+    Returns:
+        CooperativeResult: path, cost, expansions and runtime per agent and the conflicts of the paths,
+        which are only possible if an agent failed
+    """
+    t_start = time.perf_counter()
+    n = arrays.node_count
+    if wait_cost is None:
+        wait_cost = float(arrays.weights.min()) if arrays.edge_count else 1.0
+    if max_time is None:
+        max_time = 4*n
+    plans = [AgentPlan(number, start, target) for number, (start, target) in enumerate(agents)]
+    # exact distance to the target without other agents, the heuristic of every agent
+    heuristics = [distance_field(arrays, plan.target_node).distances for plan in plans]
+    positions = [arrays.index_of(plan.start_node) for plan in plans]
+    paths: List[List[int]] = [[position] for position in positions]
+    targets = [arrays.index_of(plan.target_node) for plan in plans]
+
+    rounds = 0
+    start_time = 0
+    while True:
+        rounds += 1
+        table = ReservationTable(n)
+        # rotating priorities between the windows
+        order = list(range(len(plans)))
+        if window is not None:
+            shift = (rounds - 1) % max(len(plans), 1)
+            order = order[shift:] + order[:shift]
+        for agent in order:
+            plan = plans[agent]
+            t_agent = time.perf_counter()
+            segment, cost, expansions = _plan_agent(arrays, table, heuristics[agent], positions[agent], targets[agent],
+                                                    start_time, window, wait_cost, max_time)
+            plan.expansions += expansions
+            if segment is None:
+                # no path: the agent stays where it is and blocks its node. The node may be reserved by an agent
+                # with a higher priority, the final conflict check reports such collisions.
+                plan.failed = True
+                segment = [positions[agent]]*(1 if window is None else window + 1)
+                cost = 0.0 if positions[agent] == targets[agent] else wait_cost*(len(segment) - 1)
+            table.reserve(segment, start_time, park=window is None)
+            plan.cost += cost
+            paths[agent].extend(segment[1:])
+            positions[agent] = segment[-1]
+            plan.runtime += time.perf_counter() - t_agent
+        start_time += window or 0
+        if window is None or positions == targets or start_time >= max_time:
+            break
+
+    for plan, path, position, target in zip(plans, paths, positions, targets):
+        # waits at the target at the end of the path are not part of the plan
+        while len(path) > 1 and path[-1] == target and path[-2] == target:
+            path.pop()
+        plan.reached = position == target
+        plan.path = [arrays.id_of(index) for index in path]
+    return CooperativeResult(plans, time.perf_counter() - t_start, rounds, count_conflicts(paths))
+
+
+def count_conflicts(paths: List[List[int]]) -> int:
+    """Number of vertex and swap conflicts of paths given per time step, agents stay at their last node"""
+    makespan = max((len(path) for path in paths), default=0)
+    conflicts = 0
+    for t in range(makespan):
+        at = [path[min(t, len(path) - 1)] for path in paths]
+        conflicts += len(at) - len(set(at))
+        if t + 1 < makespan:
+            moves = {(path[min(t, len(path) - 1)], path[min(t + 1, len(path) - 1)]) for path in paths}
+            conflicts += sum(1 for a, b in moves if a < b and (b, a) in moves)
+    return conflicts
+
+
+if __name__ == "__main__":
+    arrays = GraphArrays.lattice((2, 9), seed=0)
+    # agents crossing each other in the middle of the grid
+    agents = [(1, 200), (200, 1), (20, 181), (181, 20), (91, 110), (110, 91)]
+    for window in (None, 8):
+        result = cooperative_a_star(arrays, agents, window)
+        print(f'window {window}: {result.rounds} rounds, makespan {result.makespan}, cost {result.total_cost:g}, '
+              f'{result.conflicts} conflicts, {result.wall_time*1e3:.1f} ms')
+        for plan in result.plans:
+            print(f'  agent {plan.agent} {plan.start_node} -> {plan.target_node}: reached {plan.reached}, failed {plan.failed}, '
+                  f'cost {plan.cost:g}, {plan.expansions} expansions, {plan.runtime*1e3:.2f} ms')
@@ -1,17 +1,28 @@
 from typing import Optional
 
 import networkx as nx
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QGroupBox, QRadioButton, QDoubleSpinBox, QHBoxLayout, QLineEdit, QTableWidget
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QGroupBox, QRadioButton, QDoubleSpinBox, QSpinBox, QHBoxLayout, QLineEdit, QTableWidget, QFileDialog, QComboBox
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import pyqtSignal, QObject
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
 from matplotlib.axes import Axes
+from matplotlib.collections import PathCollection
+from matplotlib import colormaps
 
 
 
 from utils.a_start_algorithm import A_star, A_star_parameter
+from utils.array_search import distance_field
+from utils.anytime_search import ARA_star
+from utils.cooperative_search import cooperative_a_star
+from utils.graph_arrays import GraphArrays
+from utils.graph_plot import GraphRenderer, node_states, STATE_IDEAL_PATH, STATE_COLORS, STATE_EDGE_COLORS
 from utils.geometry import EuclidianDistance, ManhattenDistance
+from utils.parameter import TIE_BREAKING_POLICIES
+from utils.terrain import load_terrain
 from utils import constants as const
 
 ################
@@ -46,13 +57,18 @@ class MatplotlibWidget(QWidget):
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
         self._ax: Optional[Axes] = None
+        self._renderer: Optional[GraphRenderer] = None
+        # node markers of small graphs, their colors are updated in place
+        self._state_markers: Optional[PathCollection] = None
 
         # Connect the click event
         self.clicked_signal = signal
         self.figure.canvas.mpl_connect("button_press_event", self.on_click)
+        self.figure.canvas.mpl_connect("scroll_event", self.on_scroll)
 
-        # Set up the layout
+        # Set up the layout, the toolbar allows pan and zoom
         layout = QVBoxLayout()
+        layout.addWidget(NavigationToolbar(self.canvas, self))
         layout.addWidget(self.canvas)
         self.setLayout(layout)
 
@@ -66,21 +82,69 @@ class MatplotlibWidget(QWidget):
         print('user click event detected')
         if event.inaxes == self._ax:  # Ensure click is inside the plot
             print(f'click pos: {event.xdata}, {event.ydata}')
-            for node in self.algorithm.graph.nodes:
+            # nodes are placed on a grid with spacing 2, starting at (2, 2)
+            graph = self.algorithm.graph
+            column, row = int(round(event.xdata/2)), int(round(event.ydata/2))
+            if 1 <= column <= graph.width and 1 <= row <= graph.height:
+                node = graph.node_by_id((row - 1)*graph.width + column)
                 if abs(event.xdata - node.pos.x) < 0.5 and abs(event.ydata - node.pos.y) < 0.5:
+                    # nodes the current search did not touch still hold g of an older search
+                    node.refresh()
                     text = f"Node {node}: f({node.f}) = g({node.g}) + h({node.h})"
                     if self.clicked_signal:
                         self.clicked_signal.update_text.emit(text)
                     else:
                         print(text) 
 
-
+    def on_scroll(self, event):
+        """Zooms in and out around the mouse position"""
+        if event.inaxes != self._ax or event.xdata is None:
+            return
+        factor = const.SCROLL_ZOOM_FACTOR if event.button == 'up' else 1/const.SCROLL_ZOOM_FACTOR
+        x_min, x_max = self._ax.get_xlim()
+        y_min, y_max = self._ax.get_ylim()
+        self._ax.set_xlim(event.xdata - (event.xdata - x_min)*factor, event.xdata + (x_max - event.xdata)*factor)
+        self._ax.set_ylim(event.ydata - (event.ydata - y_min)*factor, event.ydata + (y_max - event.ydata)*factor)
+        self.canvas.draw_idle()
+
+    @property
+    def large_graph_mode(self) -> bool:
+        """Large graphs are drawn as raster image with level of detail instead of networkx nodes"""
+        return self.algorithm.graph.number_of_nodes() > const.LARGE_GRAPH_NODE_COUNT
+
+    def _clear_figure(self):
+        """Removes all artists, the next plot_algorithm draws the graph from scratch"""
+        self.figure.clear()
+        self._ax = self.figure.add_subplot(111)
+        self._renderer = None
+        self._state_markers = None
+
+    def plot_algorithm(self, show_current_node=False, show_open=False, show_closed=False, show_ideal_path=False):
+        """Plots the algorithm state. The graph is only drawn once, later calls update the node colors in place.
+        In large graph mode the current zoom is kept."""
+        states = node_states(self.algorithm, show_current_node, show_open, show_closed, show_ideal_path)
+        if self.large_graph_mode:
+            if self._renderer is None:
+                self._clear_figure()
+                self._renderer = GraphRenderer(self._ax, GraphArrays.from_graph(self.algorithm.graph),
+                                               self.algorithm.graph.width, self.algorithm.graph.height)
+            self._renderer.draw(states)
+        else:
+            if self._state_markers is None:
+                self._clear_figure()
+                self.algorithm.plot_graph(self._ax)
+                # one marker per node id on top of the networkx nodes, below the labels
+                graph = self.algorithm.graph
+                xy = np.array([(node.pos.x, node.pos.y) for node in map(graph.node_by_id, range(1, graph.number_of_nodes() + 1))])
+                self._state_markers = self._ax.scatter(xy[:, 0], xy[:, 1], s=const.NODE_SIZE,
+                                                       linewidths=const.NODE_EDGE_WIDTH, zorder=2.5)
+            self._state_markers.set_facecolors([STATE_COLORS[state] for state in states])
+            self._state_markers.set_edgecolors([STATE_EDGE_COLORS[state] for state in states])
 
     def init_graph_widget(self):
         """Plots the initial graph with default node colors"""
-        self._ax = self.figure.add_subplot(111)
         self.figure.subplots_adjust(left=0.001, right=0.998, top=0.998, bottom=0.001)
-        self.algorithm.plot_graph(self._ax)
+        self.plot_algorithm()
 
         # Refresh the canvas
         self.canvas.draw()
@@ -92,15 +156,13 @@ class MatplotlibWidget(QWidget):
         Returns:
             bool: True if target node is reached False otherwise
         """
-        self.figure.clear()  # Clear the figure
-        self._ax = self.figure.add_subplot(111)
         target_reached = False
         if full_run:
             target_reached = self.algorithm.full_run()
-            self.algorithm.plot_graph(self._ax, show_current_node=True, show_closed=True, show_ideal_path=True)
+            self.plot_algorithm(show_current_node=True, show_closed=True, show_ideal_path=True)
         else:
             target_reached = self.algorithm.single_step_run()
-            self.algorithm.plot_graph(self._ax, True, True, True, True)
+            self.plot_algorithm(True, True, True, True)
 
         # Refresh the canvas
         self.canvas.draw()
@@ -110,9 +172,106 @@ class MatplotlibWidget(QWidget):
         """Overwrites the current algorithm with a new one. Clears figure and draws new graph.
         """
         self.algorithm = A_star(self.a_star_parameter)
-        self.figure.clear()
-        self._ax = self.figure.add_subplot(111)
-        self.algorithm.plot_graph(self._ax)
+        self._clear_figure()
+        self.plot_algorithm()
+        self.canvas.draw()
+
+    def reload_parameters(self, previous: A_star_parameter):
+        """Applies the changed parameters. A new graph is only built if a graph parameter changed,
+        otherwise the search is reset on the existing graph and the node colors are updated in place.
+        Args:
+            previous: parameters before the change
+        """
+        if previous.graph_key() != self.a_star_parameter.graph_key():
+            self.reset_graph()
+            return
+        self.algorithm.reset_search(self.a_star_parameter)
+        self.plot_algorithm()
+        self.canvas.draw_idle()
+
+    def save_checkpoint(self):
+        """Saves the current search state, it can be continued in the GUI or with the resume command"""
+        path, _ = QFileDialog.getSaveFileName(self, "Save checkpoint", "", "Checkpoints (*.npz)")
+        if path:
+            self.algorithm.save_checkpoint(path)
+
+    def resume_checkpoint(self) -> bool:
+        """Loads a saved search state together with its parameters and draws it.
+        Returns:
+            bool: True if the loaded search already reached its target
+        """
+        path, _ = QFileDialog.getOpenFileName(self, "Resume checkpoint", "", "Checkpoints (*.npz);;All files (*)")
+        if not path:
+            return False
+        try:
+            self.algorithm = A_star.from_checkpoint(path)
+        except Exception as e:
+            print(f"Error loading checkpoint: {str(e)}")
+            return False
+        # the parameter object is shared with the main and config windows
+        for name, value in vars(self.algorithm.parameter.copy()).items():
+            setattr(self.a_star_parameter, name, value)
+        self._clear_figure()
+        self.plot_algorithm(True, True, True, True)
+        self.canvas.draw()
+        return self.algorithm.reached_target is not None
+
+    def show_distance_field(self):
+        """Draws the cost from the start node to every node of the current graph as heatmap."""
+        arrays = GraphArrays.from_graph(self.algorithm.graph, self.a_star_parameter.disabled_nodes)
+        field = distance_field(arrays, self.a_star_parameter.start_node)
+        self._clear_figure()
+        if self.large_graph_mode:
+            graph = self.algorithm.graph
+            image = self._ax.imshow(field.distances.reshape(graph.height, graph.width), origin='lower',
+                                    cmap=const.HEATMAP_CMAP, interpolation='nearest')
+            self.figure.colorbar(image, ax=self._ax, label='cost from start node')
+        else:
+            self.algorithm.plot_distance_field(field.distances, self._ax)
+        self.canvas.draw()
+
+    def anytime_run(self):
+        """Runs ARA* starting with h_scale as weight and draws every improved path when it arrives."""
+        arrays = GraphArrays.from_graph(self.algorithm.graph)
+        for solution in ARA_star(arrays, self.a_star_parameter).solutions():
+            if self.large_graph_mode:
+                self.plot_algorithm()
+                states = self._renderer.states.copy()
+                states[[node_id - 1 for node_id in solution.path[1:-1]]] = STATE_IDEAL_PATH
+                self._renderer.draw(states)
+            else:
+                self._clear_figure()
+                self.algorithm.plot_graph(self._ax)
+                self.algorithm.plot_path(solution.path, self._ax)
+            self._ax.set_title(f"weight {solution.weight:.2f}: cost {solution.cost:g}, "
+                               f"suboptimality bound {solution.bound:.3f}, {solution.expansions} expansions")
+            self.canvas.draw()
+            QApplication.processEvents()
+
+    def cooperative_run(self):
+        """Plans the agents of the parameters cooperatively and draws every path in its own color."""
+        if not self.a_star_parameter.agents:
+            if self.clicked_signal:
+                self.clicked_signal.update_text.emit("No agents configured, add them in the settings!")
+            return
+        arrays = GraphArrays.from_graph(self.algorithm.graph, self.a_star_parameter.disabled_nodes)
+        result = cooperative_a_star(arrays, self.a_star_parameter.agents, const.COOPERATIVE_WINDOW or None)
+        self._clear_figure()
+        self.plot_algorithm()
+        cmap = colormaps[const.AGENT_CMAP]
+        for plan in result.plans:
+            color = cmap(plan.agent % cmap.N)
+            xy = arrays.xy[[node_id - 1 for node_id in plan.path]]
+            # waits are not visible in the line, the path is drawn in space only
+            self._ax.plot(xy[:, 0], xy[:, 1], color=color, linewidth=3, alpha=0.8, zorder=5,
+                          label=f"agent {plan.agent}: {plan.expansions} expansions" + ("" if plan.reached else " (blocked)")
+                          + (" (failed)" if plan.failed else ""))
+            self._ax.scatter(xy[0, 0], xy[0, 1], color=color, marker='s', s=120, zorder=6)
+            self._ax.scatter(xy[-1, 0], xy[-1, 1], color=color, marker='*', s=250, zorder=6)
+        self._ax.legend(loc='upper left', fontsize=8)
+        self._ax.set_title(f"{len(result.plans)} agents: makespan {result.makespan}, cost {result.total_cost:g}, "
+                           f"{result.total_expansions} expansions in {result.wall_time*1e3:.1f} ms"
+                           + (f", {result.conflicts} conflicts" if result.conflicts else ""))
         self.canvas.draw()
 
 class ConfigWidget(QWidget):
@@ -154,6 +313,15 @@ class ConfigWidget(QWidget):
         h_scale_layout.addWidget(self.h_scale_sb)
         v_layout.addLayout(h_scale_layout)
 
+        # order of open nodes with equal f
+        tie_breaking_layout = QHBoxLayout()
+        tie_breaking_layout.addWidget(QLabel('Tie-breaking (equal f): '))
+        self.tie_breaking_cb = QComboBox()
+        self.tie_breaking_cb.addItems(TIE_BREAKING_POLICIES)
+        self.tie_breaking_cb.setCurrentText(self.a_star_parameter.tie_breaking)
+        tie_breaking_layout.addWidget(self.tie_breaking_cb)
+        v_layout.addLayout(tie_breaking_layout)
+
         # edge weights
         group_box = QGroupBox("Edge weights:")
         group_box.setStyleSheet("QGroupBox { font-weight: bold; font-size: 14px; }")
@@ -204,12 +372,43 @@ class ConfigWidget(QWidget):
         group_box.setLayout(group_layout)
         v_layout.addWidget(group_box)
 
+        # grid size
+        grid_size_layout = QHBoxLayout()
+        grid_size_max = const.TERRAIN_SIZE_MAX if a_star_parameter.terrain else const.GRID_SIZE_MAX
+        grid_size_layout.addWidget(QLabel('Grid nodes horizontal: '))
+        self.grid_width_sb = QSpinBox()
+        self.grid_width_sb.setMinimum(1)
+        self.grid_width_sb.setMaximum(grid_size_max)
+        self.grid_width_sb.setValue(self.a_star_parameter.grid_width)
+        grid_size_layout.addWidget(self.grid_width_sb)
+        grid_size_layout.addWidget(QLabel('vertical: '))
+        self.grid_height_sb = QSpinBox()
+        self.grid_height_sb.setMinimum(1)
+        self.grid_height_sb.setMaximum(grid_size_max)
+        self.grid_height_sb.setValue(self.a_star_parameter.grid_height)
+        grid_size_layout.addWidget(self.grid_height_sb)
+        v_layout.addLayout(grid_size_layout)
+
+        # terrain image, replaces the grid size and the edge weights
+        terrain_layout = QHBoxLayout()
+        terrain_layout.addWidget(QLabel('Terrain image:'))
+        self.terrain_input = QLineEdit()
+        self.terrain_input.setPlaceholderText("greyscale PNG, pixel value = cost, black = blocked")
+        if a_star_parameter.terrain:
+            self.terrain_input.setText(a_star_parameter.terrain)
+        self.terrain_input.textChanged.connect(self.update_grid_size_limits)
+        terrain_layout.addWidget(self.terrain_input)
+        terrain_browse_button = QPushButton('Browse')
+        terrain_browse_button.clicked.connect(self.browse_terrain)
+        terrain_layout.addWidget(terrain_browse_button)
+        v_layout.addLayout(terrain_layout)
+
         # choose start node
         start_node_layout = QHBoxLayout()
         start_node_layout.addWidget(QLabel('Startnode number: '))
         self.start_node_sb = QDoubleSpinBox()
         self.start_node_sb.setMinimum(1)  # Set minimum value
-        self.start_node_sb.setMaximum(200)  # Set maximum value
+        self.start_node_sb.setMaximum(self.a_star_parameter.node_count)  # Set maximum value
         self.start_node_sb.setSingleStep(1)  # Set the step size
         self.start_node_sb.setDecimals(0)  # Number of decimal places
         self.start_node_sb.setValue(self.a_star_parameter.start_node)  # Set the initial value
@@ -221,13 +420,35 @@ class ConfigWidget(QWidget):
         target_node_layout.addWidget(QLabel('Targetnode number: '))
         self.target_node_sb = QDoubleSpinBox()
         self.target_node_sb.setMinimum(1)  # Set minimum value
-        self.target_node_sb.setMaximum(200)  # Set maximum value
+        self.target_node_sb.setMaximum(self.a_star_parameter.node_count)  # Set maximum value
         self.target_node_sb.setSingleStep(1)  # Set the step size
         self.target_node_sb.setDecimals(0)  # Number of decimal places
         self.target_node_sb.setValue(self.a_star_parameter.target_node)  # Set the initial value
         target_node_layout.addWidget(self.target_node_sb)
         v_layout.addLayout(target_node_layout)
 
+        # additional target nodes, the search ends at the nearest one
+        additional_targets_layout = QHBoxLayout()
+        additional_targets_layout.addWidget(QLabel('Additional targetnodes:'))
+        self.additional_targets_input = QLineEdit()
+        if not a_star_parameter.additional_target_nodes:
+            self.additional_targets_input.setPlaceholderText("ex.: 20, 181")
+        else:
+            self.additional_targets_input.setText(str(a_star_parameter.additional_target_nodes)[1:-1])
+        additional_targets_layout.addWidget(self.additional_targets_input)
+        v_layout.addLayout(additional_targets_layout)
+
+        # agents of the cooperative multi-agent run
+        agents_layout = QHBoxLayout()
+        agents_layout.addWidget(QLabel('Agents (start-target):'))
+        self.agents_input = QLineEdit()
+        if not a_star_parameter.agents:
+            self.agents_input.setPlaceholderText("ex.: 1-200, 200-1, 20-181")
+        else:
+            self.agents_input.setText(", ".join(f"{start}-{target}" for start, target in a_star_parameter.agents))
+        agents_layout.addWidget(self.agents_input)
+        v_layout.addLayout(agents_layout)
+
         # disabled nodes
         disabled_nodes_layout  = QHBoxLayout()
         disabled_nodes_layout.addWidget(QLabel('Disable nodes:'))
@@ -249,6 +470,40 @@ class ConfigWidget(QWidget):
         v_layout.addWidget(reload_algo_button)
         self.setLayout(v_layout)
 
+        self.grid_width_sb.valueChanged.connect(self.update_node_number_limits)
+        self.grid_height_sb.valueChanged.connect(self.update_node_number_limits)
+
+    @property
+    def node_count(self) -> int:
+        return int(self.grid_width_sb.value())*int(self.grid_height_sb.value())
+
+    @property
+    def grid_size_max(self) -> int:
+        """Lattices are capped to what networkx can build, terrain images may be much larger"""
+        if self.terrain_input.text().strip():
+            return const.TERRAIN_SIZE_MAX
+        return const.GRID_SIZE_MAX
+
+    def update_grid_size_limits(self):
+        """Adapts the grid size inputs to lattice or terrain graph"""
+        self.grid_width_sb.setMaximum(self.grid_size_max)
+        self.grid_height_sb.setMaximum(self.grid_size_max)
+
+    def update_node_number_limits(self):
+        """Adapts the node number inputs to the selected grid size"""
+        self.start_node_sb.setMaximum(self.node_count)
+        self.target_node_sb.setMaximum(self.node_count)
+        self.check_disabled_nodes_text()
+
+    def browse_terrain(self):
+        """Selects a terrain image and adapts the grid size to it"""
+        path, _ = QFileDialog.getOpenFileName(self, "Terrain image", "", "Images (*.png);;All files (*)")
+        if path:
+            self.terrain_input.setText(path)
+            height, width = load_terrain(path).shape
+            self.grid_width_sb.setValue(width)
+            self.grid_height_sb.setValue(height)
+
     def check_disabled_nodes_text(self):
         check_ok = True
         try:
@@ -256,8 +511,8 @@ class ConfigWidget(QWidget):
             if not disabled_text == "":
                 nodes_list = [int(item.strip()) for item in disabled_text.split(",")]
                 for node in nodes_list:
-                    if not 1 <= node <= 200:
-                        raise ValueError(f'Node number {node} out of bounds (1, 200)! Can not create disabled node')
+                    if not 1 <= node <= self.node_count:
+                        raise ValueError(f'Node number {node} out of bounds (1, {self.node_count})! Can not create disabled node')
         except Exception as e:
             print(str(e))
             check_ok = False
@@ -270,15 +525,27 @@ class ConfigWidget(QWidget):
             self.disabled_nodes_error_label.show()
 
     def reload_algo_and_plot(self):
+        previous = self.a_star_parameter.copy()
         if self.euclidian_rb.isChecked():
             self.a_star_parameter.distance_method = EuclidianDistance()
         elif self.manhatten_rb.isChecked():
             self.a_star_parameter.distance_method = ManhattenDistance()
         self.a_star_parameter.h_scale = float(self.h_scale_sb.value())
+        self.a_star_parameter.tie_breaking = self.tie_breaking_cb.currentText()
         if self.fixed_edge_weight_rb.isChecked():
             self.a_star_parameter.edge_weight = float(self.fixed_edge_weight_sb.value())
         elif self.random_edge_weight_rb.isChecked():
             self.a_star_parameter.edge_weight = (int(self.random_weight_sb_min.value()), int(self.random_weight_sb_max.value()))
+        self.a_star_parameter.grid_width = int(self.grid_width_sb.value())
+        self.a_star_parameter.grid_height = int(self.grid_height_sb.value())
+        self.a_star_parameter.terrain = self.terrain_input.text().strip() or None
+        if self.a_star_parameter.terrain:
+            try:
+                height, width = load_terrain(self.a_star_parameter.terrain).shape
+                self.a_star_parameter.grid_width, self.a_star_parameter.grid_height = width, height
+            except Exception as e:
+                print(f"Error reading terrain image: {str(e)}")
+                self.a_star_parameter.terrain = None
         self.a_star_parameter.start_node = int(self.start_node_sb.value())
         self.a_star_parameter.target_node = int(self.target_node_sb.value())
 
@@ -291,7 +558,27 @@ class ConfigWidget(QWidget):
         except Exception as e:
             print(f"Error reading disabled nodes list: {str(e)}")
 
-        self.graph_widget.reset_graph()
+        try:
+            targets_text = self.additional_targets_input.text()
+            nodes_list = []
+            if targets_text != "":
+                nodes_list = [int(item.strip()) for item in targets_text.split(",")]
+            self.a_star_parameter.additional_target_nodes = nodes_list
+        except Exception as e:
+            print(f"Error reading additional target nodes list: {str(e)}")
+
+        try:
+            agents_text = self.agents_input.text()
+            agents = []
+            if agents_text != "":
+                for item in agents_text.split(","):
+                    start, target = item.split("-")
+                    agents.append((int(start.strip()), int(target.strip())))
+            self.a_star_parameter.agents = agents
+        except Exception as e:
+            print(f"Error reading agents list: {str(e)}")
+
+        self.graph_widget.reload_parameters(previous)
         self.close()
         self.graph_widget.target_reached_signal.reached.emit(False)
 
@@ -0,0 +1,340 @@
+"""Differential correctness and performance harness.
+Random scenarios (size, obstacle density, weight range, heuristic, kind) are solved by A_star.full_run, every
+array based engine and the networkx reference (astar_path/dijkstra_path on the same Graph).
+The kinds cover the engine modes: lattices, several target nodes, terrain images and a disabled start node.
+Each engine result is checked against the optimal cost of networkx (multi_source_dijkstra from the targets)
+whenever its heuristic requirement holds, the admissibility and consistency of the heuristic are checked
+exactly with distance fields from the targets.
+"""
+# standard lib
+from typing import Optional, List, Dict, Callable, Tuple
+from dataclasses import dataclass
+import contextlib
+import io
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# Third-party imports
+import numpy as np
+import networkx as nx  # type: ignore
+
+# Local application imports
+from utils.a_start_algorithm import A_star
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter, TIE_BREAKING_POLICIES
+from utils import constants as const
+
+VERIFY_COLUMNS = ["scenario", "seed", "kind", "width", "height", "obstacle_density", "edge_weight", "distance_method", "h_scale",
+                  "tie_breaking", "start_node", "target_node", "admissible", "consistent", "engine", "requires", "status",
+                  "reached", "cost", "optimal_cost", "runtime", "speedup"]
+
+# engine runtimes are compared with this engine
+REFERENCE_ENGINE = "nx_astar"
+
+# lattice: one target, multi_target: additional target nodes, terrain: cost image with blocked cells,
+# disabled_start: the start node is disabled and no engine may reach a target
+SCENARIO_KINDS = ("lattice", "multi_target", "terrain", "disabled_start")
+
+# joins all targets for the networkx A* with several targets
+SUPER_TARGET = "targets"
+
+
+@dataclass
+class Scenario:
+    seed: int
+    width: int
+    height: int
+    obstacle_density: float
+    parameter: A_star_parameter
+    kind: str = "lattice"
+    terrain: Optional[np.ndarray] = None  # costs of a terrain scenario, see terrain.load_terrain
+
+
+@dataclass
+class EngineRun:
+    reached: bool
+    cost: float
+    at_limit: bool = False  # a bounded engine stopped because of its budget
+    diverged: bool = False  # the engine does not reproduce the search it mirrors (parity check)
+
+
+def random_scenario(seed: int, min_size: int = 5, max_size: int = 30, max_obstacle_density: float = 0.3,
+                    h_scales: Tuple[float, ...] = (1.0, 1.0, 1.5, 3.0),
+                    kinds: Tuple[str, ...] = SCENARIO_KINDS) -> Scenario:
+    """Random grid, weights, obstacles, heuristic, tie-breaking, start/target nodes and kind for one seed"""
+    rng = random.Random(seed)
+    kind = rng.choice(kinds)
+    width, height = rng.randint(min_size, max_size), rng.randint(min_size, max_size)
+    low = rng.randint(1, 4)
+    edge_weight = rng.choice([float(low), (low, low + rng.randint(1, 10))])
+    density = rng.uniform(0.0, max_obstacle_density)
+    terrain = None
+    if kind == "terrain":
+        # networkx reference: the graph must not be a lazy terrain graph
+        height = max(1, min(height, const.LARGE_GRAPH_NODE_COUNT // width))
+        terrain = np.random.default_rng(seed).integers(2, 256, size=(height, width)).astype(np.float64)
+        blocked = rng.sample(range(width*height), int(density*(width*height - 2)))
+        terrain.ravel()[blocked] = 0
+        free = (np.flatnonzero(terrain.ravel() > 0) + 1).tolist()
+        start, target = rng.sample(free, 2)
+        disabled: List[int] = []
+    else:
+        start, target = rng.sample(range(1, width*height + 1), 2)
+        candidates = [node for node in range(1, width*height + 1) if node not in (start, target)]
+        disabled = rng.sample(candidates, int(density*len(candidates)))
+    additional_targets: List[int] = []
+    if kind == "multi_target":
+        enabled = sorted(set(range(1, width*height + 1)) - set(disabled) - {start, target})
+        additional_targets = rng.sample(enabled, min(len(enabled), rng.randint(1, 3)))
+    elif kind == "disabled_start":
+        disabled.append(start)
+    distance_method, h_scale = rng.choice(["euclidian", "manhatten"]), rng.choice(h_scales)
+    parameter = A_star_parameter.from_dict({
+        "distance_method": distance_method, "h_scale": h_scale,
+        "edge_weight": edge_weight, "start_node": start, "target_node": target, "disabled_nodes": disabled,
+        "additional_target_nodes": additional_targets,
+        "grid_width": width, "grid_height": height, "tie_breaking": rng.choice(TIE_BREAKING_POLICIES)})
+    return Scenario(seed, width, height, density, parameter, kind, terrain)
+
+
+def heuristic_properties(arrays: GraphArrays, h: np.ndarray, target_nodes: List[int]) -> Tuple[bool, bool]:
+    """Exact check of a heuristic on the enabled part of the graph.
+    Returns:
+        (admissible, consistent): h <= true cost to the nearest target for every node,
+        h(u) <= w(u, v) + h(v) for every edge
+    """
+    from utils.array_search import distance_field
+
+    # the graph is undirected, the distances from the targets are the costs to the nearest target
+    distances = np.min([distance_field(arrays, target_node).distances for target_node in target_nodes], axis=0)
+    tolerance = 1e-9*max(1.0, float(np.max(h[np.isfinite(h)], initial=0.0)))
+    admissible = bool(np.all(h[np.isfinite(distances)] <= distances[np.isfinite(distances)] + tolerance))
+    edge_start = np.repeat(np.arange(arrays.node_count), np.diff(arrays.indptr))
+    enabled = ~arrays.disabled[edge_start] & ~arrays.disabled[arrays.indices]
+    consistent = bool(np.all(h[edge_start][enabled] <= arrays.weights[enabled] + h[arrays.indices][enabled] + tolerance))
+    return admissible, consistent
+
+
+def _engines(scenario: Scenario, algorithm: A_star, arrays: GraphArrays, reference_graph: nx.Graph,
+             selected: Optional[List[str]] = None) -> Dict[str, Tuple[str, Callable[[], EngineRun]]]:
+    """Engine name -> (heuristic requirement for an optimal result, run function) of the selected engines
+    (all if None) and the reference engine. Preprocessing is only done for selected engines.
+    Requirements: "none" always optimal, "admissible" or "consistent" of the scaled heuristic,
+    "unscaled_consistent" of the heuristic without h_scale.
+    """
+    from utils.array_search import array_a_star, distance_field, record_search
+    from utils.anytime_search import ARA_star
+    from utils.memory_bounded_search import ida_star, sma_star
+    from utils.contraction_hierarchies import build_contraction_hierarchy, ch_a_star
+
+    def wanted(name: str) -> bool:
+        return selected is None or name in selected or name == REFERENCE_ENGINE
+
+    parameter = scenario.parameter
+    node_count = arrays.node_count
+    target_nodes = parameter.all_target_nodes
+    h = arrays.heuristic(parameter.distance_method, target_nodes, parameter.h_scale)
+    start = algorithm.graph.node_by_id(parameter.start_node)
+    targets = [algorithm.graph.node_by_id(node_id) for node_id in target_nodes if node_id not in parameter.disabled_nodes]
+
+    def a_star() -> EngineRun:
+        with contextlib.redirect_stdout(io.StringIO()):
+            reached = algorithm.full_run()
+        return EngineRun(reached, algorithm.reached_target.g if reached else math.inf)
+
+    def networkx_run(search: Callable) -> EngineRun:
+        try:
+            path = search()
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return EngineRun(False, math.inf)
+        path = [node for node in path if node != SUPER_TARGET]
+        return EngineRun(True, float(nx.path_weight(reference_graph, path, weight='weight')))
+
+    def nx_astar() -> list:
+        if len(target_nodes) == 1:
+            return nx.astar_path(reference_graph, start, targets[0] if targets else algorithm.graph.target_node,
+                                 heuristic=lambda u, v: h[u._id - 1], weight='weight')
+        # several targets: A* to a super target joined to all targets with cost 0
+        graph = nx.Graph(reference_graph)
+        graph.add_weighted_edges_from((target, SUPER_TARGET, 0.0) for target in targets)
+        return nx.astar_path(graph, start, SUPER_TARGET, weight='weight',
+                             heuristic=lambda u, v: 0.0 if isinstance(u, str) else h[u._id - 1])
+
+    def nx_dijkstra() -> list:
+        if not targets:
+            raise nx.NetworkXNoPath()
+        # the graph is undirected, the path from the nearest target to the start is the reversed path
+        return nx.multi_source_dijkstra(reference_graph, set(targets), start, weight='weight')[1][::-1]
+
+    def array_like(result) -> EngineRun:
+        return EngineRun(result.reached, result.cost)
+
+    def array(dijkstra: bool) -> EngineRun:
+        return array_like(array_a_star(arrays, parameter, dijkstra))
+
+    def recording() -> EngineRun:
+        # the recording has to expand the same nodes in the same order as array_a_star
+        recorded = record_search(arrays, parameter)
+        result = array_a_star(arrays, parameter)
+        current = recorded.current(recorded.step_count)
+        reached = current != -1 and bool(np.isin(current, recorded.targets))
+        path = [arrays.id_of(index) for index in recorded.path(recorded.step_count)] if reached else []
+        cost = float(nx.path_weight(reference_graph, [algorithm.graph.node_by_id(node_id) for node_id in path],
+                                    weight='weight')) if reached else math.inf
+        diverged = reached != result.reached or recorded.step_count != result.expansions or (reached and path != result.path)
+        return EngineRun(reached, cost, diverged=diverged)
+
+    def field() -> EngineRun:
+        distances = distance_field(arrays, parameter.start_node, target_nodes=target_nodes)
+        cost = min(distances.cost_to(node_id) for node_id in target_nodes)
+        return EngineRun(math.isfinite(cost), cost)
+
+    def ara() -> EngineRun:
+        solution = ARA_star(arrays, parameter).run()
+        return EngineRun(solution is not None, solution.cost if solution else math.inf)
+
+    def bounded(search: Callable, max_expansions: int) -> EngineRun:
+        result = search(max_expansions)
+        return EngineRun(result.reached, result.cost, not result.reached and result.expansions >= max_expansions)
+
+    max_expansions = 50*node_count
+    # preprocessing is not part of the measured query runtime
+    hierarchy = build_contraction_hierarchy(arrays) if wanted("ch") else None
+    node_budget = 2
+    if wanted("sma"):
+        # tight SMA* budget, a random fraction of the graph: forgetting and backed up f values are exercised,
+        # but the optimal path (shortest.path nodes) still fits
+        shortest = array_a_star(arrays, parameter, dijkstra=True)
+        node_budget = max(len(shortest.path) + 1, int(random.Random(scenario.seed).uniform(0.05, 0.5)*node_count), 2)
+    engines = {
+        "a_star": ("consistent", a_star),
+        "nx_astar": ("admissible", lambda: networkx_run(nx_astar)),
+        "nx_dijkstra": ("none", lambda: networkx_run(nx_dijkstra)),
+        "array": ("consistent", lambda: array(False)),
+        "array_dijkstra": ("none", lambda: array(True)),
+        "recording": ("consistent", recording),
+        "distance_field": ("none", field),
+        "ch": ("none", lambda: array_like(ch_a_star(hierarchy, parameter))),
+        "ara": ("unscaled_consistent", ara),
+        "ida": ("admissible", lambda: bounded(
+            lambda limit: ida_star(arrays, parameter, limit, trace_memory=False), max_expansions)),
+        "sma": ("admissible", lambda: bounded(
+            lambda limit: sma_star(arrays, parameter, node_budget, limit, trace_memory=False), max_expansions)),
+    }
+    return {name: engine for name, engine in engines.items() if wanted(name)}
+
+
+def optimal_cost(graph: nx.Graph, start, targets: list) -> float:
+    """networkx reference: cost from start to the nearest target, inf if no target is reachable"""
+    if start not in graph or not targets:
+        return math.inf
+    try:
+        return float(nx.multi_source_dijkstra(graph, set(targets), start, weight='weight')[0])
+    except nx.NetworkXNoPath:
+        return math.inf
+
+
+def verify_scenario(number: int, scenario: Scenario, engines: Optional[List[str]] = None) -> List[dict]:
+    """Runs all engines (or the given ones) on one scenario and returns one row per engine.
+    Status: "ok", "wrong" (optimality or reachability violated, or a parity check failed), "error"
+    (exception although the requirement holds), "unsupported" (exception with a heuristic the engine does not
+    support) or "limit" (budget used up).
+    """
+    if scenario.terrain is None:
+        return _verify_scenario(number, scenario, scenario.parameter, engines)
+    from utils.terrain import save_terrain
+
+    # A_star loads terrains from image files
+    with tempfile.TemporaryDirectory() as directory:
+        parameter = scenario.parameter.copy()
+        parameter.terrain = os.path.join(directory, "terrain.png")
+        save_terrain(scenario.terrain, parameter.terrain)
+        return _verify_scenario(number, scenario, parameter, engines)
+
+
+def _verify_scenario(number: int, scenario: Scenario, parameter: A_star_parameter, engines: Optional[List[str]]) -> List[dict]:
+    # the random edge weights of Graph come from the random module
+    state = random.getstate()
+    random.seed(scenario.seed)
+    algorithm = A_star(parameter)
+    random.setstate(state)
+    graph = algorithm.graph
+    arrays = GraphArrays.from_graph(graph, parameter.disabled_nodes)
+    target_nodes = parameter.all_target_nodes
+    h = arrays.heuristic(parameter.distance_method, target_nodes, parameter.h_scale)
+    admissible, consistent = heuristic_properties(arrays, h, target_nodes)
+    unscaled = arrays.heuristic(parameter.distance_method, target_nodes, 1.0)
+    holds = {"none": True, "admissible": admissible, "consistent": consistent,
+             "unscaled_consistent": heuristic_properties(arrays, unscaled, target_nodes)[1]}
+    disabled = {graph.node_by_id(node_id) for node_id in parameter.disabled_nodes}
+    reference_graph = nx.restricted_view(graph, disabled, [])
+    optimal = optimal_cost(reference_graph, graph.node_by_id(parameter.start_node),
+                           [graph.node_by_id(node_id) for node_id in target_nodes if node_id not in parameter.disabled_nodes])
+
+    rows = []
+    for name, (requires, run) in _engines(scenario, algorithm, arrays, reference_graph, engines).items():
+        exact = holds[requires]
+        t_start = time.perf_counter()
+        try:
+            result: Optional[EngineRun] = run()
+        except Exception:
+            result = None
+        runtime = time.perf_counter() - t_start
+        if result is None:
+            status = "error" if exact else "unsupported"
+        elif result.diverged:
+            status = "wrong"
+        elif result.at_limit:
+            status = "limit"
+        elif result.reached != math.isfinite(optimal):
+            status = "wrong"
+        elif result.reached and (result.cost < optimal - 1e-9 or (exact and not math.isclose(result.cost, optimal))):
+            status = "wrong"
+        else:
+            status = "ok"
+        rows.append({
+            "scenario": number, "seed": scenario.seed, "kind": scenario.kind, "width": scenario.width,
+            "height": scenario.height, "obstacle_density": round(scenario.obstacle_density, 3),
+            "edge_weight": str(parameter.edge_weight), "distance_method": str(parameter.distance_method),
+            "h_scale": parameter.h_scale, "tie_breaking": parameter.tie_breaking,
+            "start_node": parameter.start_node, "target_node": parameter.target_node,
+            "admissible": admissible, "consistent": consistent, "engine": name, "requires": requires,
+            "status": status, "reached": result.reached if result else None, "cost": result.cost if result else None,
+            "optimal_cost": optimal, "runtime": runtime, "speedup": None})
+    reference = next(row["runtime"] for row in rows if row["engine"] == REFERENCE_ENGINE)
+    for row in rows:
+        row["speedup"] = reference/row["runtime"] if row["runtime"] > 0 else None
+    return rows
+
+
+def run_harness(count: int, seed: int = 0, engines: Optional[List[str]] = None, **scenario_options) -> List[dict]:
+    """Verifies count random scenarios, see random_scenario for the scenario options"""
+    # first run of every engine compiles/loads the numba kernels, it is not part of the measurement
+    verify_scenario(-1, random_scenario(seed - 1, 3, 3), engines)
+    rows = []
+    for number in range(count):
+        rows.extend(verify_scenario(number, random_scenario(seed + number, **scenario_options), engines))
+    return rows
+
+
+def summarize(rows: List[dict]) -> Dict[str, dict]:
+    """Status counts and median speedup vs. the networkx A* per engine"""
+    summary: Dict[str, dict] = {}
+    for row in rows:
+        engine = summary.setdefault(row["engine"], {"runs": 0, "speedups": []})
+        engine["runs"] += 1
+        engine[row["status"]] = engine.get(row["status"], 0) + 1
+        if row["status"] == "ok" and row["speedup"] is not None:
+            engine["speedups"].append(row["speedup"])
+    for engine in summary.values():
+        speedups = engine.pop("speedups")
+        engine["median_speedup"] = statistics.median(speedups) if speedups else None
+    return summary
+
+
+def failures(rows: List[dict]) -> List[dict]:
+    return [row for row in rows if row["status"] in ("wrong", "error")]
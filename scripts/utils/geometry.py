@@ -37,6 +37,12 @@ class DistanceFunc(ABC):
     @abstractmethod
     def get_distance(self, point1: Point2D, point2: Point2D) -> float:
         raise NotImplementedError('Abstract method called!')
+
+    def get_distances(self, points: np.ndarray, point: Point2D) -> np.ndarray:
+        """Distances from every row of an (n, 2) coordinate array to one point.
+        Subclasses override this with a vectorized version.
+        """
+        return np.array([self.get_distance(Point2D(x, y), point) for x, y in points], dtype=np.float64)
     
     def __call__(self, *args, **kwargs):
         if not kwargs:
@@ -53,6 +59,9 @@ class EuclidianDistance(DistanceFunc):
     def get_distance(self, point1: Point2D, point2: Point2D):
         return ((point2.x - point1.x) ** 2 + (point2.y - point1.y) ** 2) ** 0.6
 
+    def get_distances(self, points: np.ndarray, point: Point2D) -> np.ndarray:
+        return ((point.x - points[:, 0]) ** 2 + (point.y - points[:, 1]) ** 2) ** 0.6
+
     def __str__(self):
         return "Euclidian distance"
     
@@ -66,6 +75,9 @@ class ManhattenDistance(DistanceFunc):
     def get_distance(self, point1: Point2D, point2: Point2D):
         return np.sum([np.abs(point1.x - point2.x),  np.abs(point1.y - point2.y)])
 
+    def get_distances(self, points: np.ndarray, point: Point2D) -> np.ndarray:
+        return np.abs(points[:, 0] - point.x) + np.abs(points[:, 1] - point.y)
+
     def __str__(self):
         return "Manhatten distance"
     
@@ -74,6 +86,14 @@ class ManhattenDistance(DistanceFunc):
             return True
         return False
 
+def distance_function_from_name(name: str) -> DistanceFunc:
+    """Creates a distance function from its str() name or a short name like 'euclidian'"""
+    for dist_class in (EuclidianDistance, ManhattenDistance):
+        dist_func = dist_class()
+        if name.lower() in (str(dist_func).lower(), str(dist_func).split()[0].lower()):
+            return dist_func
+    raise ValueError(f'Unknown distance method {name}!')
+
 if __name__ == "__main__":
     print(ManhattenDistance())
     print(EuclidianDistance() == EuclidianDistance())
\ No newline at end of file
@@ -8,11 +8,23 @@ import numpy as np
 
 # Local application imports
 from utils.geometry import Point2D
+from utils.graph_arrays import GraphArrays
 from utils import constants as const
 
+class SearchGeneration():
+    """Counter shared by all nodes of a graph. g and parent of a node are only valid in the generation
+    they were set in, incrementing the counter resets the search values of all nodes in O(1).
+    A search calls Node.refresh once when it touches a node first, the g and parent getters do not check it.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
 class Node():
 
-    def __init__(self, pos: Point2D, id: int):
+    def __init__(self, pos: Point2D, id: int, generation: Optional[SearchGeneration] = None):
         self.pos = pos
         self._id = id
         self.connected_nodes: list[Node] = []
@@ -20,6 +32,15 @@ class Node():
         self._h: float = float('inf')
         self._f: float = 0
         self._parent: Optional[Node] = None
+        self._generation = generation if generation is not None else SearchGeneration()
+        self._stamp = self._generation.value
+
+    def refresh(self):
+        """Drops g and parent of an older search generation"""
+        if self._stamp != self._generation.value:
+            self._g = float('inf')
+            self._parent = None
+            self._stamp = self._generation.value
 
     @property
     def parent(self):
@@ -47,9 +68,7 @@ class Node():
 
     @property
     def f(self) -> float:
-        h = self._h
-        g = self._g
-        return g + h
+        return self._g + self._h
     
     @f.setter
     def f(self, cost: float):
@@ -100,7 +119,12 @@ class Graph(nx.Graph):
     see documenation for nx.Graph: https://networkx.org
     """
     
-    def __init__(self, start_node_id: int = 0, target_node_id: int = -1, edge_weight: Union[float, Tuple] = 2):
+    def __init__(self, start_node_id: int = 0, target_node_id: int = -1, edge_weight: Union[float, Tuple] = 2,
+                 width: int = const.GRID_WIDTH, height: int = const.GRID_HEIGHT, terrain: Optional[np.ndarray] = None):
+        """Grid graph with uniform or random edge weights, or of a terrain cost raster (see terrain.load_terrain).
+        With a terrain, width and height follow from its shape and edge_weight is ignored.
+        Large terrains are not copied into networkx, their nodes are created on first access.
+        """
         super(Graph, self).__init__()
         self._start_node_id = start_node_id
         self._target_node_id = target_node_id
@@ -108,20 +132,38 @@ class Graph(nx.Graph):
             if np.abs(int(edge_weight) - edge_weight) < 0.1:
                 edge_weight = int(edge_weight)
         self._edge_weight = edge_weight
-        
-        self.init_nodes()
+        self.width = width
+        self.height = height
+        self._node_list: list[Node] = []
+        self.generation = SearchGeneration()
+        # array layout of terrain graphs, the blocked cells are marked as disabled
+        self.arrays: Optional[GraphArrays] = None
+        # lazy terrain graphs: created nodes by id and h per node index for new nodes
+        self._lazy_nodes: Optional[dict[int, Node]] = None
+        self._node_h: Optional[np.ndarray] = None
+
+        if terrain is not None:
+            self.arrays = GraphArrays.from_terrain(terrain)
+            self.height, self.width = terrain.shape
+            if self.arrays.node_count > const.LARGE_GRAPH_NODE_COUNT:
+                self._lazy_nodes = {}
+            else:
+                self.init_nodes_from_arrays()
+        else:
+            self.init_nodes()
 
     def init_nodes(self):
         i = 1
-        for y in range(1, 11, 1): # 10 Nodes vertical
-            for x in range(1, 21, 1): # 20 Nodes horizontal
+        for y in range(1, self.height + 1, 1): # Nodes vertical
+            for x in range(1, self.width + 1, 1): # Nodes horizontal
                 # Knoten erzeugen
-                node = Node(Point2D(2*x, 2*y), i)
+                node = Node(Point2D(2*x, 2*y), i, self.generation)
                 self.add_node(node)
-                if node._id-1 >= 1 and not (node._id%20==1):
-                    node.connected_nodes.append(list(self.nodes)[node._id-2])
-                if node._id -20 >= 1:
-                    node.connected_nodes.append(list(self.nodes)[node._id-21])
+                self._node_list.append(node)
+                if node._id-1 >= 1 and not ((node._id - 1) % self.width == 0):
+                    node.connected_nodes.append(self._node_list[node._id-2])
+                if node._id - self.width >= 1:
+                    node.connected_nodes.append(self._node_list[node._id-1-self.width])
                 # Kanten hinzufügen
                 for neighbour in node.connected_nodes:
                     edge_weight = self._edge_weight
@@ -130,13 +172,86 @@ class Graph(nx.Graph):
                     self.add_edge(node, neighbour, color='blue', weight=edge_weight)
                 i+=1
 
+    def set_edge_weights(self, arrays: GraphArrays):
+        """Takes the edge weights of arrays with the same grid layout, e.g. the seeded weights of GraphArrays.lattice"""
+        edge_start = np.repeat(np.arange(arrays.node_count), np.diff(arrays.indptr))
+        upper = edge_start < arrays.indices
+        for u, v, weight in zip(edge_start[upper].tolist(), arrays.indices[upper].tolist(), arrays.weights[upper].tolist()):
+            self[u + 1][v + 1]['weight'] = weight
+
+    def init_nodes_from_arrays(self):
+        """Creates nodes and edges of self.arrays with one bulk call each instead of one call per cell"""
+        arrays = self.arrays
+        self._node_list = [Node(Point2D(x, y), i, self.generation) for i, (x, y) in enumerate(arrays.xy.tolist(), start=1)]
+        self.add_nodes_from(self._node_list)
+        edge_start = np.repeat(np.arange(arrays.node_count), np.diff(arrays.indptr))
+        upper = edge_start < arrays.indices
+        self.add_weighted_edges_from(zip(map(self._node_list.__getitem__, edge_start[upper].tolist()),
+                                         map(self._node_list.__getitem__, arrays.indices[upper].tolist()),
+                                         arrays.weights[upper].tolist()), color='blue')
+
+    @property
+    def is_lazy(self) -> bool:
+        """True for large terrain graphs which are not stored in networkx"""
+        return self._lazy_nodes is not None
+
+    @property
+    def blocked_node_ids(self) -> list[int]:
+        """Ids of the blocked terrain cells, empty for lattice graphs"""
+        if self.arrays is None:
+            return []
+        return (np.flatnonzero(self.arrays.disabled) + 1).tolist()
+
+    def set_node_heuristic(self, h: np.ndarray):
+        """Sets h per node index, also for the nodes of a lazy graph which are created later"""
+        self._node_h = h
+        for node in (self._lazy_nodes.values() if self.is_lazy else self._node_list):
+            node.h = float(h[node._id - 1])
+
+    def reset_search(self, start_node_id: int, target_node_id: int):
+        """Invalidates g and parent of all nodes in O(1) and sets new start and target nodes"""
+        self.generation.value += 1
+        self._start_node_id = start_node_id
+        self._target_node_id = target_node_id
+
+    def number_of_nodes(self) -> int:
+        if self.is_lazy:
+            return self.arrays.node_count
+        return super().number_of_nodes()
+
+    def neighbors(self, n):
+        if not self.is_lazy:
+            return super().neighbors(n)
+        index = (n._id if isinstance(n, Node) else n) - 1
+        return iter([self.node_by_id(int(k) + 1) for k in self.arrays.indices[self.arrays.indptr[index]:self.arrays.indptr[index + 1]]])
+
+    def __getitem__(self, n):
+        if not self.is_lazy:
+            return super().__getitem__(n)
+        index = (n._id if isinstance(n, Node) else n) - 1
+        start, end = self.arrays.indptr[index], self.arrays.indptr[index + 1]
+        return {self.node_by_id(int(k) + 1): {'weight': float(w)}
+                for k, w in zip(self.arrays.indices[start:end], self.arrays.weights[start:end])}
+
+    def node_by_id(self, node_id: int) -> Node:
+        if self.is_lazy:
+            node = self._lazy_nodes.get(node_id)
+            if node is None:
+                x, y = self.arrays.xy[node_id - 1]
+                node = Node(Point2D(float(x), float(y)), node_id, self.generation)
+                if self._node_h is not None:
+                    node.h = float(self._node_h[node_id - 1])
+                self._lazy_nodes[node_id] = node
+            return node
+        return self._node_list[node_id - 1]
+
     @property
     def start_node(self) -> Node:
-        return list(self.nodes)[self._start_node_id - 1]
+        return self.node_by_id(self._start_node_id)
     
     @property
     def target_node(self) -> Node:
-        return list(self.nodes)[self._target_node_id - 1]
+        return self.node_by_id(self._target_node_id)
 
 
 
@@ -0,0 +1,166 @@
+# standard lib
+from typing import List, Optional, Iterable, Union, Tuple
+from dataclasses import dataclass
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.geometry import DistanceFunc, Point2D
+from utils import constants as const
+
+
+@dataclass
+class GraphArrays:
+    """Flat NumPy representation of a graph for the array based search engines.
+    Node ids are 1-based like in Graph, array index = node id - 1.
+    The adjacency is stored in CSR layout: the neighbours of node index i are
+    indices[indptr[i]:indptr[i+1]] with the edge costs at the same positions in weights.
+    """
+    xy: np.ndarray          # (n, 2) float64 node positions
+    indptr: np.ndarray      # (n + 1,) int64
+    indices: np.ndarray     # (m,) int64 neighbour node indices
+    weights: np.ndarray     # (m,) float64 edge weights
+    disabled: np.ndarray    # (n,) bool, True if the node must not be expanded (blocked cells of the graph)
+
+    @property
+    def node_count(self) -> int:
+        return self.xy.shape[0]
+
+    @property
+    def edge_count(self) -> int:
+        """Number of undirected edges"""
+        return self.indices.shape[0] // 2
+
+    @staticmethod
+    def index_of(node_id: int) -> int:
+        return node_id - 1
+
+    @staticmethod
+    def id_of(index: int) -> int:
+        return int(index) + 1
+
+    def disabled_mask(self, disabled_nodes: Iterable[int]) -> np.ndarray:
+        """New mask of self.disabled and the disabled nodes of a query, the arrays are not changed.
+        The arrays are shared between concurrent queries, every search uses its own mask.
+        """
+        mask = self.disabled.copy()
+        mask[np.fromiter(disabled_nodes, dtype=np.int64) - 1] = True
+        return mask
+
+    def heuristic(self, dist_func: DistanceFunc, target_nodes: Union[int, Iterable[int]], scale_factor: float) -> np.ndarray:
+        """Same values as A_star.init_heuristic_estimation, for all nodes at once.
+        With several target nodes the distance to the nearest target is used.
+        """
+        if isinstance(target_nodes, (int, np.integer)):
+            target_nodes = [target_nodes]
+        distances = np.full(self.node_count, np.inf)
+        for target_node in target_nodes:
+            target_xy = self.xy[self.index_of(target_node)]
+            np.minimum(distances, dist_func.get_distances(self.xy, Point2D(target_xy[0], target_xy[1])), out=distances)
+        return scale_factor*distances
+
+    def path_ids(self, parent: np.ndarray, end_index: int) -> List[int]:
+        """Follows the parent array from end_index back to the root.
+        Returns:
+            List[int]: node ids from the root to the end node
+        """
+        path = []
+        index = end_index
+        while index != -1:
+            path.append(self.id_of(index))
+            index = parent[index]
+        path.reverse()
+        return path
+
+    @classmethod
+    def from_edges(cls, xy: np.ndarray, edge_start: np.ndarray, edge_end: np.ndarray, edge_weight: np.ndarray) -> "GraphArrays":
+        """Builds the CSR layout from arrays of undirected edges (node indices) with bulk numpy operations"""
+        node_count = xy.shape[0]
+        sources = np.concatenate([edge_start, edge_end]).astype(np.int64)
+        targets = np.concatenate([edge_end, edge_start]).astype(np.int64)
+        weights = np.concatenate([edge_weight, edge_weight]).astype(np.float64)
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+        return cls(np.ascontiguousarray(xy, dtype=np.float64), indptr, targets[order], weights[order],
+                   np.zeros(node_count, dtype=np.bool_))
+
+    @classmethod
+    def lattice(cls, edge_weight: Union[float, Tuple] = 2.0, width: int = const.GRID_WIDTH, height: int = const.GRID_HEIGHT,
+                seed: Optional[int] = None) -> "GraphArrays":
+        """Same grid layout as Graph.init_nodes without creating the networkx graph.
+        Args:
+            edge_weight: fixed weight or (min, max) for random integer weights
+            width: nodes in x direction
+            height: nodes in y direction
+            seed: seed for the random weights
+        """
+        x, y = np.meshgrid(np.arange(1, width + 1), np.arange(1, height + 1))
+        xy = np.column_stack([2.0*x.ravel(), 2.0*y.ravel()])
+        index = np.arange(width*height).reshape(height, width)
+        edge_start = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+        edge_end = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+        if isinstance(edge_weight, tuple):
+            rng = np.random.default_rng(seed)
+            weights = rng.integers(edge_weight[0], edge_weight[1] + 1, size=edge_start.shape[0]).astype(np.float64)
+        else:
+            weights = np.full(edge_start.shape[0], float(edge_weight))
+        return cls.from_edges(xy, edge_start, edge_end, weights)
+
+    @classmethod
+    def from_terrain(cls, costs: np.ndarray) -> "GraphArrays":
+        """4-connected grid of a cost raster, see terrain.load_terrain.
+        Node id 1 is costs[0, 0] (bottom left), ids increase along the rows like in Graph.init_nodes.
+        The weight of an edge is the mean cost of its two cells, cells with cost <= 0 are blocked (no edges).
+        The neighbour lists are built directly in CSR order without sorting.
+        """
+        height, width = costs.shape
+        node_count = width*height
+        costs = np.ascontiguousarray(costs, dtype=np.float64).ravel()
+        free = costs > 0
+        x, y = np.meshgrid(np.arange(1, width + 1), np.arange(1, height + 1))
+        xy = np.column_stack([2.0*x.ravel(), 2.0*y.ravel()])
+
+        # neighbour candidates per node in the order left, right, down, up
+        index = np.arange(node_count).reshape(height, width)
+        neighbours = np.full((height, width, 4), -1, dtype=np.int64)
+        neighbours[:, 1:, 0] = index[:, :-1]
+        neighbours[:, :-1, 1] = index[:, 1:]
+        neighbours[1:, :, 2] = index[:-1, :]
+        neighbours[:-1, :, 3] = index[1:, :]
+        neighbours = neighbours.reshape(node_count, 4)
+        valid = (neighbours >= 0) & free[:, None]
+        valid &= free[np.where(valid, neighbours, 0)]
+
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(valid.sum(axis=1), out=indptr[1:])
+        indices = neighbours[valid]
+        weights = 0.5*(np.repeat(costs, 4).reshape(node_count, 4)[valid] + costs[indices])
+        return cls(xy, indptr, indices, weights, ~free)
+
+    @classmethod
+    def from_graph(cls, graph, disabled_nodes: Optional[Iterable[int]] = None) -> "GraphArrays":
+        """Converts a Graph (networkx based) into the flat array layout"""
+        if getattr(graph, 'arrays', None) is not None:
+            # graph built from arrays (terrain), only the disabled nodes differ
+            return cls(graph.arrays.xy, graph.arrays.indptr, graph.arrays.indices, graph.arrays.weights,
+                       graph.arrays.disabled_mask(disabled_nodes or []))
+        nodes = list(graph.nodes)
+        node_count = len(nodes)
+        xy = np.empty((node_count, 2), dtype=np.float64)
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        indices: List[int] = []
+        weights: List[float] = []
+        for node in nodes:
+            index = cls.index_of(node._id)
+            xy[index] = (node.pos.x, node.pos.y)
+        for node in sorted(nodes, key=lambda n: n._id):
+            index = cls.index_of(node._id)
+            for neighbour, edge_data in graph.adj[node].items():
+                indices.append(cls.index_of(neighbour._id))
+                weights.append(edge_data['weight'])
+            indptr[index + 1] = len(indices)
+        disabled = np.zeros(node_count, dtype=np.bool_)
+        disabled[np.fromiter(disabled_nodes or [], dtype=np.int64) - 1] = True
+        return cls(xy, indptr, np.array(indices, dtype=np.int64), np.array(weights, dtype=np.float64), disabled)
@@ -0,0 +1,177 @@
+"""Level of detail rendering for large graphs.
+The node states are drawn as one raster image, markers, labels and edges are only drawn
+for the nodes in the visible area once the view is zoomed in far enough.
+"""
+# standard lib
+from typing import Optional, List, TYPE_CHECKING
+
+# Third-party imports
+import numpy as np
+from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
+from matplotlib.colors import ListedColormap
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+import utils.constants as const
+if TYPE_CHECKING:
+    from utils.a_start_algorithm import A_star
+    from utils.array_search import SearchRecording
+
+# node states, higher states are drawn on top of lower ones
+STATE_DEFAULT = 0
+STATE_DISABLED = 1
+STATE_CLOSED = 2
+STATE_OPEN = 3
+STATE_IDEAL_PATH = 4
+STATE_CURRENT = 5
+STATE_START = 6
+STATE_TARGET = 7
+STATE_COLORS = [const.NODE_COLOR_DEFAULT, const.NODE_COLOR_DISABLE, const.NODE_COLOR_CLOSED, const.NODE_COLOR_OPEN,
+                const.NODE_COLOR_IDEAL_PATH, const.NODE_COLOR_CURRENT, const.NODE_COLOR_START, const.NODE_COLOR_TARGET]
+STATE_EDGE_COLORS = [const.NODE_EDGE_COLOR_DEFAULT, const.NODE_EDGE_COLOR_DISABLE, const.NODE_EDGE_COLOR_CLOSED,
+                     const.NODE_EDGE_COLOR_OPEN, const.NODE_EDGE_COLOR_IDEAL, const.NODE_EDGE_COLOR_CURRENT,
+                     const.NODE_EDGE_COLOR_START, const.NODE_EDGE_COLOR_TARGET]
+
+
+def node_states(algorithm: "A_star", show_current_node=False, show_open=False, show_closed=False,
+                show_ideal_path=False) -> np.ndarray:
+    """State per node index with the same rules as A_star.plot_graph"""
+    states = np.full(algorithm.graph.number_of_nodes(), STATE_DEFAULT, dtype=np.int8)
+    if show_closed:
+        states[[node._id - 1 for node in algorithm.closed_list]] = STATE_CLOSED
+    if show_open:
+        states[[node._id - 1 for node in algorithm.open_list]] = STATE_OPEN
+    states[[node_id - 1 for node_id in algorithm.disabled_nodes]] = STATE_DISABLED
+    if algorithm.graph.arrays is not None:
+        states[algorithm.graph.arrays.disabled] = STATE_DISABLED
+    if show_current_node and algorithm.current_node:
+        if show_ideal_path:
+            node = algorithm.current_node
+            while node.parent:
+                states[node._id - 1] = STATE_IDEAL_PATH
+                node = node.parent
+        states[algorithm.current_node._id - 1] = STATE_CURRENT
+    states[algorithm.graph.start_node._id - 1] = STATE_START
+    states[[node._id - 1 for node in algorithm.target_nodes]] = STATE_TARGET
+    return states
+
+
+def recording_states(recording: "SearchRecording", step: int) -> np.ndarray:
+    """State per node index after step expansions of a recorded search, see array_search.record_search"""
+    states = np.full(recording.open_step.shape[0], STATE_DEFAULT, dtype=np.int8)
+    opened, closed = recording.open_and_closed(step)
+    states[closed] = STATE_CLOSED
+    states[opened] = STATE_OPEN
+    states[recording.disabled] = STATE_DISABLED
+    path = recording.path(step)
+    if path:
+        states[path] = STATE_IDEAL_PATH
+        states[path[-1]] = STATE_CURRENT
+    states[recording.start] = STATE_START
+    states[recording.targets] = STATE_TARGET
+    return states
+
+
+class GraphRenderer():
+    """Draws a grid graph with level of detail into a matplotlib axes.
+    The detail layer is updated whenever the axes limits change (pan/zoom).
+    """
+
+    def __init__(self, ax: Axes, arrays: GraphArrays, width: int, height: int):
+        self.ax = ax
+        self.arrays = arrays
+        self.width = width
+        self.height = height
+        self.states = np.zeros(arrays.node_count, dtype=np.int8)
+        self._image = None
+        self._detail_artists: List = []
+        self._drawing_details = False
+        self._visible_key: Optional[tuple] = None
+        self._cmap = ListedColormap(STATE_COLORS)
+        x_min, y_min = arrays.xy.min(axis=0)
+        x_max, y_max = arrays.xy.max(axis=0)
+        self._spacing_x = (x_max - x_min)/max(width - 1, 1) if width > 1 else 2.0
+        self._spacing_y = (y_max - y_min)/max(height - 1, 1) if height > 1 else 2.0
+        self._extent = (x_min - self._spacing_x/2, x_max + self._spacing_x/2,
+                        y_min - self._spacing_y/2, y_max + self._spacing_y/2)
+        ax.callbacks.connect('xlim_changed', self._on_limits_changed)
+        ax.callbacks.connect('ylim_changed', self._on_limits_changed)
+
+    def draw(self, states: Optional[np.ndarray] = None):
+        """Draws the raster image of all node states and the detail layer of the visible nodes"""
+        if states is not None:
+            self.states = states
+        grid = self.states.reshape(self.height, self.width)
+        if self._image is None:
+            self._image = self.ax.imshow(grid, cmap=self._cmap, vmin=0, vmax=len(STATE_COLORS) - 1, origin='lower',
+                                         extent=self._extent, interpolation='nearest', aspect='equal')
+            self.ax.set_axis_off()
+            # the detail artists must not change the view limits
+            self.ax.set_autoscale_on(False)
+        else:
+            self._image.set_data(grid)
+        self._draw_details(force=True)
+
+    def _visible_nodes(self) -> np.ndarray:
+        x_min, x_max = sorted(self.ax.get_xlim())
+        y_min, y_max = sorted(self.ax.get_ylim())
+        xy = self.arrays.xy
+        visible = (xy[:, 0] >= x_min) & (xy[:, 0] <= x_max) & (xy[:, 1] >= y_min) & (xy[:, 1] <= y_max)
+        return np.flatnonzero(visible)
+
+    def _draw_details(self, force: bool = False):
+        visible_key = (self.ax.get_xlim(), self.ax.get_ylim())
+        if self._drawing_details or (visible_key == self._visible_key and not force):
+            return
+        self._visible_key = visible_key
+        self._drawing_details = True
+        try:
+            self._update_detail_artists()
+        finally:
+            self._drawing_details = False
+
+    def _update_detail_artists(self):
+        for artist in self._detail_artists:
+            artist.remove()
+        self._detail_artists = []
+        visible = self._visible_nodes()
+        if visible.shape[0] > const.LOD_MARKER_NODE_LIMIT:
+            # zoomed out: the raster image is enough
+            return
+        xy = self.arrays.xy
+        # edges between visible nodes
+        is_visible = np.zeros(self.arrays.node_count, dtype=np.bool_)
+        is_visible[visible] = True
+        counts = self.arrays.indptr[visible + 1] - self.arrays.indptr[visible]
+        edge_start = np.repeat(visible, counts)
+        edge_positions = np.concatenate([np.arange(self.arrays.indptr[i], self.arrays.indptr[i + 1]) for i in visible]) \
+            if visible.shape[0] else np.zeros(0, dtype=np.int64)
+        edge_end = self.arrays.indices[edge_positions]
+        keep = (edge_start < edge_end) & is_visible[edge_end]
+        edge_start, edge_end, edge_positions = edge_start[keep], edge_end[keep], edge_positions[keep]
+        lines = LineCollection(np.stack([xy[edge_start], xy[edge_end]], axis=1), colors=const.EDGE_COLOR,
+                               linewidths=0.5, zorder=2)
+        self.ax.add_collection(lines, autolim=False)
+        self._detail_artists.append(lines)
+
+        # node markers, scaled to the zoom level
+        marker_size = const.NODE_SIZE*min(1.0, 200/max(visible.shape[0], 1))
+        markers = self.ax.scatter(xy[visible, 0], xy[visible, 1], s=marker_size,
+                                  c=[STATE_COLORS[state] for state in self.states[visible]],
+                                  edgecolors=const.NODE_EDGE_COLOR_DEFAULT, linewidths=const.NODE_EDGE_WIDTH/2, zorder=3)
+        self._detail_artists.append(markers)
+
+        if visible.shape[0] <= const.LOD_LABEL_NODE_LIMIT:
+            for index in visible:
+                self._detail_artists.append(self.ax.text(xy[index, 0], xy[index, 1], str(GraphArrays.id_of(index)),
+                                                         ha='center', va='center', fontsize=8, zorder=4))
+            for start, end, k in zip(edge_start, edge_end, edge_positions):
+                center = (xy[start] + xy[end])/2
+                self._detail_artists.append(self.ax.text(center[0], center[1], f'{self.arrays.weights[k]:g}',
+                                                         ha='center', va='center', fontsize=7, zorder=4,
+                                                         color=const.EDGE_COLOR, backgroundcolor='white'))
+
+    def _on_limits_changed(self, ax: Axes):
+        # the caller of the limit change (toolbar, scroll handler) redraws the canvas
+        self._draw_details()
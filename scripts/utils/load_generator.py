@@ -0,0 +1,104 @@
+"""Load generator for the path query service (utils.path_service).
+Opens a number of keep-alive connections and sends random path queries as fast as the service answers.
+Queries are drawn from a small pool, so identical queries are in flight at the same time and coalesced.
+"""
+# standard lib
+from typing import Optional, List
+import asyncio
+import json
+import random
+import time
+
+# Local application imports
+from utils.path_service import LatencyHistogram
+
+
+def random_queries(node_count: int, pool_size: int, seed: int = 0, dijkstra_share: float = 0.0) -> List[dict]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(pool_size):
+        start, target = rng.sample(range(1, node_count + 1), 2)
+        query = {"start_node": start, "target_node": target, "h_scale": 1.0, "distance_method": "manhatten"}
+        if rng.random() < dijkstra_share:
+            query["dijkstra"] = True
+        queries.append(query)
+    return queries
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                   body: bytes = b"") -> tuple:
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def _open(host: str, port: int, unix_socket: Optional[str]):
+    if unix_socket:
+        return await asyncio.open_unix_connection(unix_socket)
+    return await asyncio.open_connection(host, port)
+
+
+async def _client(host: str, port: int, unix_socket: Optional[str], queries: List[dict], deadline: float,
+                  remaining: List[int], histogram: LatencyHistogram, statuses: dict, rng: random.Random):
+    reader, writer = await _open(host, port, unix_socket)
+    try:
+        while remaining[0] > 0 and time.perf_counter() < deadline:
+            remaining[0] -= 1
+            body = json.dumps(rng.choice(queries)).encode()
+            t_start = time.perf_counter()
+            status, _ = await _request(reader, writer, "POST", "/path", body)
+            histogram.observe(time.perf_counter() - t_start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(host: str = "127.0.0.1", port: int = 8080, unix_socket: Optional[str] = None,
+                   connections: int = 32, requests: int = 10000, duration: float = 30.0, pool_size: int = 100,
+                   seed: int = 0) -> dict:
+    """Runs the load test until all requests are sent or the duration is over.
+    Args:
+        host: service host
+        port: service port
+        unix_socket: path of the unix socket, replaces host and port
+        connections: number of concurrent keep-alive connections
+        requests: total number of requests
+        duration: maximal duration in seconds
+        pool_size: number of distinct queries
+        seed: seed of the query pool
+    Returns:
+        dict: client side throughput, latency and status counts and the metrics of the service
+    """
+    reader, writer = await _open(host, port, unix_socket)
+    _, health = await _request(reader, writer, "GET", "/health")
+    node_count = json.loads(health)["nodes"]
+    queries = random_queries(node_count, pool_size, seed)
+
+    histogram = LatencyHistogram()
+    statuses: dict = {}
+    remaining = [requests]
+    t_start = time.perf_counter()
+    deadline = t_start + duration
+    await asyncio.gather(*[_client(host, port, unix_socket, queries, deadline, remaining, histogram, statuses,
+                                   random.Random(seed + i + 1)) for i in range(connections)])
+    elapsed = time.perf_counter() - t_start
+
+    _, metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+    return {
+        "requests": histogram.count,
+        "elapsed": elapsed,
+        "throughput": histogram.count/elapsed if elapsed > 0 else 0.0,
+        "status": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": histogram.snapshot(),
+        "service": json.loads(metrics),
+    }
@@ -28,6 +28,7 @@ class MainWindow(QMainWindow):
         ##########
         menu_bar = self.menuBar()
         file_menu = menu_bar.addMenu(QIcon('pictures/settings_button.png'), "File")
+        analysis_menu = menu_bar.addMenu("Analysis")
         info_menu = menu_bar.addMenu("Info")
 
         # Add "Info" action
@@ -40,6 +41,29 @@ class MainWindow(QMainWindow):
         settings_action.triggered.connect(self.show_config_page)
         file_menu.addAction(settings_action)
 
+        # Add checkpoint actions
+        save_checkpoint_action = QAction("Save checkpoint", self)
+        save_checkpoint_action.triggered.connect(self.save_checkpoint_action)
+        file_menu.addAction(save_checkpoint_action)
+        resume_checkpoint_action = QAction("Resume checkpoint", self)
+        resume_checkpoint_action.triggered.connect(self.resume_checkpoint_action)
+        file_menu.addAction(resume_checkpoint_action)
+
+        # Add "Distance heatmap" action
+        heatmap_action = QAction("Distance heatmap from start node", self)
+        heatmap_action.triggered.connect(self.show_distance_field_action)
+        analysis_menu.addAction(heatmap_action)
+
+        # Add "Anytime run" action
+        anytime_action = QAction("Anytime run (ARA*)", self)
+        anytime_action.triggered.connect(self.anytime_run_action)
+        analysis_menu.addAction(anytime_action)
+
+        # Add "Cooperative run" action
+        cooperative_action = QAction("Cooperative multi-agent run", self)
+        cooperative_action.triggered.connect(self.cooperative_run_action)
+        analysis_menu.addAction(cooperative_action)
+
         ###############
         # Window Layout
         ###############
@@ -101,6 +125,22 @@ class MainWindow(QMainWindow):
         self.config_widget = ConfigWidget(self.matplotlib_widget, self.a_star_parameter)
         self.config_widget.show()
 
+    def save_checkpoint_action(self):
+        self.matplotlib_widget.save_checkpoint()
+
+    def resume_checkpoint_action(self):
+        target_reached = self.matplotlib_widget.resume_checkpoint()
+        self.matplotlib_widget.target_reached_signal.reached.emit(target_reached)
+
+    def show_distance_field_action(self):
+        self.matplotlib_widget.show_distance_field()
+
+    def anytime_run_action(self):
+        self.matplotlib_widget.anytime_run()
+
+    def cooperative_run_action(self):
+        self.matplotlib_widget.cooperative_run()
+
     def hide_buttons(self, hide: bool, button_next: QPushButton, button_last: QPushButton):
         button_next.setDisabled(hide)
         button_last.setDisabled(hide)
@@ -0,0 +1,357 @@
+"""Memory bounded search variants for graphs where the open and closed lists of A* do not fit.
+IDA* only keeps the current path, SMA* keeps at most a fixed number of search tree nodes
+and forgets the worst leaves when the budget is reached.
+"""
+# standard lib
+from typing import List, Optional, Dict
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import time
+import tracemalloc
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.array_search import distance_field
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter
+import utils.constants as const
+
+
+@dataclass
+class MemoryBoundedResult:
+    reached: bool
+    path: List[int] = field(default_factory=list)  # node ids from start to the reached target
+    cost: float = float('inf')
+    expansions: int = 0         # all expansions including the repeated ones
+    re_expansions: int = 0      # expansions of nodes that were expanded before
+    peak_nodes: int = 0         # maximal number of search nodes stored at the same time
+    peak_memory: int = 0        # peak of python allocations during the search in bytes (tracemalloc)
+    runtime: float = 0.0
+
+
+def _heuristic(arrays: GraphArrays, parameter: A_star_parameter) -> np.ndarray:
+    return arrays.heuristic(parameter.distance_method, parameter.all_target_nodes, parameter.h_scale)
+
+
+def _target_mask(arrays: GraphArrays, parameter: A_star_parameter) -> np.ndarray:
+    is_target = np.zeros(arrays.node_count, dtype=np.bool_)
+    for node_id in parameter.all_target_nodes:
+        is_target[arrays.index_of(node_id)] = True
+    return is_target
+
+
+def _unreachable(arrays: GraphArrays, parameter: A_star_parameter, disabled: np.ndarray) -> bool:
+    """True if the start node is disabled or no target can be reached from it.
+    IDA* and SMA* can not detect this themselves, they would search until their expansion cap.
+    """
+    if disabled[arrays.index_of(parameter.start_node)]:
+        return True
+    field = distance_field(arrays, parameter.start_node, target_nodes=parameter.all_target_nodes, disabled=disabled)
+    return not any(np.isfinite(field.cost_to(node_id)) for node_id in parameter.all_target_nodes)
+
+
+def _expansion_cap(arrays: GraphArrays, max_expansions: Optional[int]) -> int:
+    if max_expansions is None:
+        return const.MEMORY_BOUNDED_EXPANSIONS_PER_NODE*arrays.node_count
+    return max_expansions
+
+
+def _measured(search, trace_memory: bool):
+    """Runs search() and fills runtime and peak_memory of its result"""
+    if not trace_memory:
+        t_start = time.perf_counter()
+        result = search()
+        result.runtime = time.perf_counter() - t_start
+        return result
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    t_start = time.perf_counter()
+    result = search()
+    result.runtime = time.perf_counter() - t_start
+    result.peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    return result
+
+
+def ida_star(arrays: GraphArrays, parameter: A_star_parameter, max_expansions: Optional[int] = None,
+             trace_memory: bool = True) -> MemoryBoundedResult:
+    """Iterative deepening A*: repeated depth first searches with an increasing f bound.
+    Memory is linear in the path length, nodes are expanded again in every iteration.
+    Args:
+        arrays: graph in array layout
+        parameter: algorithm parameter, uses the same heuristic as A_star
+        max_expansions: stops unsuccessfully after this many expansions,
+            None for const.MEMORY_BOUNDED_EXPANSIONS_PER_NODE * node count
+        trace_memory: measures peak_memory with tracemalloc, which slows the search down considerably
+    """
+    h = _heuristic(arrays, parameter)
+    is_target = _target_mask(arrays, parameter)
+    disabled = arrays.disabled_mask(parameter.disabled_nodes)
+    start = arrays.index_of(parameter.start_node)
+    max_expansions = _expansion_cap(arrays, max_expansions)
+    if _unreachable(arrays, parameter, disabled):
+        return MemoryBoundedResult(False)
+
+    def search() -> MemoryBoundedResult:
+        result = MemoryBoundedResult(False)
+        expanded = np.zeros(arrays.node_count, dtype=np.bool_)
+        bound = h[start]
+        while True:
+            # iterative depth first search, a stack frame is (node, g, next neighbour position)
+            path = [start]
+            on_path = {start}
+            stack = [(start, 0.0, arrays.indptr[start])]
+            next_bound = float('inf')
+            result.peak_nodes = max(result.peak_nodes, 1)
+            while stack:
+                node, g, k = stack[-1]
+                if k == arrays.indptr[node]:
+                    # first visit of this node in the current iteration
+                    f = g + h[node]
+                    if f > bound:
+                        next_bound = min(next_bound, f)
+                        stack.pop()
+                        on_path.discard(path.pop())
+                        continue
+                    if is_target[node]:
+                        result.reached = True
+                        result.cost = float(g)
+                        result.path = [arrays.id_of(index) for index in path]
+                        return result
+                    result.expansions += 1
+                    if expanded[node]:
+                        result.re_expansions += 1
+                    expanded[node] = True
+                    if result.expansions >= max_expansions:
+                        return result
+                if k == arrays.indptr[node + 1]:
+                    stack.pop()
+                    on_path.discard(path.pop())
+                    continue
+                stack[-1] = (node, g, k + 1)
+                neighbour = arrays.indices[k]
+                if neighbour in on_path or disabled[neighbour]:
+                    continue
+                path.append(neighbour)
+                on_path.add(neighbour)
+                stack.append((neighbour, g + arrays.weights[k], arrays.indptr[neighbour]))
+                result.peak_nodes = max(result.peak_nodes, len(stack))
+            if next_bound == float('inf'):
+                # search space exhausted, target not reachable
+                return result
+            bound = next_bound
+
+    return _measured(search, trace_memory)
+
+
+class _SMANode():
+    """Node of the SMA* search tree. Several tree nodes can belong to the same graph node."""
+    __slots__ = ('index', 'g', 'f', 'depth', 'parent', 'edge', 'next_edge', 'children', 'forgotten',
+                 'queue_key', 'expanded')
+
+    def __init__(self, index: int, g: float, f: float, depth: int, parent: Optional["_SMANode"], edge: int,
+                 next_edge: int):
+        self.index = index
+        self.g = g
+        self.f = f
+        self.depth = depth
+        self.parent = parent
+        self.edge = edge                    # CSR position of the edge from the parent
+        self.next_edge = next_edge          # CSR position of the next successor which was never generated
+        self.children: Dict[int, _SMANode] = {}
+        self.forgotten: Dict[int, float] = {}   # CSR edge position -> f of a dropped successor
+        self.queue_key: Optional[int] = None    # counter of the valid queue entry, None if not queued
+        self.expanded = False
+
+
+def sma_star(arrays: GraphArrays, parameter: A_star_parameter, node_budget: int,
+             max_expansions: Optional[int] = None, trace_memory: bool = True) -> MemoryBoundedResult:
+    """Simplified memory bounded A* (Russell 1992). At most node_budget search tree nodes are kept.
+    If the budget is reached, the shallowest leaf with the highest f is dropped and its f is
+    remembered by its parent, which regenerates the successor when it becomes the best node again.
+    Args:
+        arrays: graph in array layout
+        parameter: algorithm parameter, uses the same heuristic as A_star
+        node_budget: maximal number of stored search tree nodes, paths longer than this are not found
+        max_expansions: stops unsuccessfully after this many expansions,
+            None for const.MEMORY_BOUNDED_EXPANSIONS_PER_NODE * node count
+        trace_memory: measures peak_memory with tracemalloc, which slows the search down considerably
+    """
+    if node_budget < 2:
+        raise ValueError('SMA* needs a node budget of at least 2!')
+    h = _heuristic(arrays, parameter)
+    is_target = _target_mask(arrays, parameter)
+    disabled = arrays.disabled_mask(parameter.disabled_nodes)
+    start = arrays.index_of(parameter.start_node)
+    max_expansions = _expansion_cap(arrays, max_expansions)
+    if _unreachable(arrays, parameter, disabled):
+        return MemoryBoundedResult(False)
+    indptr, indices, weights = arrays.indptr, arrays.indices, arrays.weights
+
+    def search() -> MemoryBoundedResult:
+        result = MemoryBoundedResult(False)
+        expanded = np.zeros(arrays.node_count, dtype=np.bool_)
+        counter = itertools.count()
+        best_heap: List[tuple] = []     # (f, -depth, key, node): deepest node with the lowest f first
+        worst_heap: List[tuple] = []    # (-f, depth, key, node): shallowest node with the highest f first
+
+        def enqueue(tree_node: _SMANode):
+            key = next(counter)
+            tree_node.queue_key = key
+            heapq.heappush(best_heap, (tree_node.f, -tree_node.depth, key, tree_node))
+            heapq.heappush(worst_heap, (-tree_node.f, tree_node.depth, key, tree_node))
+
+        def on_path(tree_node: Optional[_SMANode], index: int) -> bool:
+            while tree_node:
+                if tree_node.index == index:
+                    return True
+                tree_node = tree_node.parent
+            return False
+
+        def valid_successor(tree_node: _SMANode, k: int) -> bool:
+            neighbour = indices[k]
+            return not disabled[neighbour] and not on_path(tree_node, neighbour)
+
+        def has_new_successors(tree_node: _SMANode) -> bool:
+            while tree_node.next_edge < indptr[tree_node.index + 1]:
+                if valid_successor(tree_node, tree_node.next_edge):
+                    return True
+                tree_node.next_edge += 1
+            return False
+
+        def backup(tree_node: Optional[_SMANode]):
+            """Sets f of completely generated nodes to the best f of their successors, up to the root"""
+            while tree_node and not has_new_successors(tree_node):
+                new_f = min([child.f for child in tree_node.children.values()] + list(tree_node.forgotten.values()),
+                            default=float('inf'))
+                if new_f == tree_node.f:
+                    break
+                tree_node.f = new_f
+                if tree_node.queue_key is not None or not tree_node.children:
+                    # childless nodes stay in the queue to be dropped later
+                    enqueue(tree_node)
+                tree_node = tree_node.parent
+
+        def drop_worst_leaf(keep: _SMANode):
+            skipped = []
+            while worst_heap:
+                entry = heapq.heappop(worst_heap)
+                leaf = entry[3]
+                if leaf.queue_key != entry[2]:
+                    continue
+                if leaf.children or leaf.parent is None or leaf is keep:
+                    skipped.append(entry)
+                    continue
+                for skipped_entry in skipped:
+                    heapq.heappush(worst_heap, skipped_entry)
+                leaf.queue_key = None
+                parent = leaf.parent
+                del parent.children[leaf.index]
+                parent.forgotten[leaf.edge] = leaf.f
+                if parent.queue_key is None:
+                    enqueue(parent)
+                backup(parent)
+                return
+            raise RuntimeError('SMA*: no leaf left to drop!')
+
+        root = _SMANode(start, 0.0, h[start], 0, None, -1, indptr[start])
+        enqueue(root)
+        stored = 1
+        result.peak_nodes = 1
+        while True:
+            tree_node = None
+            while best_heap:
+                entry = heapq.heappop(best_heap)
+                if entry[3].queue_key == entry[2]:
+                    tree_node = entry[3]
+                    break
+            if tree_node is None or tree_node.f == float('inf'):
+                return result
+            if is_target[tree_node.index]:
+                result.reached = True
+                result.cost = float(tree_node.g)
+                path = []
+                while tree_node:
+                    path.append(arrays.id_of(tree_node.index))
+                    tree_node = tree_node.parent
+                result.path = path[::-1]
+                return result
+
+            # next successor: first the never generated ones, then the best forgotten one
+            if has_new_successors(tree_node):
+                k = tree_node.next_edge
+                tree_node.next_edge += 1
+                f = float('nan')
+            elif tree_node.forgotten:
+                k = min(tree_node.forgotten, key=tree_node.forgotten.get)
+                f = tree_node.forgotten.pop(k)
+            else:
+                # dead end, all successors are on the path or disabled
+                tree_node.queue_key = None
+                tree_node.f = float('inf')
+                if tree_node.parent:
+                    del tree_node.parent.children[tree_node.index]
+                    stored -= 1
+                    backup(tree_node.parent)
+                continue
+
+            if not tree_node.expanded:
+                tree_node.expanded = True
+                result.expansions += 1
+                if expanded[tree_node.index]:
+                    result.re_expansions += 1
+                expanded[tree_node.index] = True
+            elif f == f:
+                # successor is regenerated after it was dropped
+                result.expansions += 1
+                result.re_expansions += 1
+            if result.expansions > max_expansions:
+                return result
+
+            neighbour = indices[k]
+            g = tree_node.g + weights[k]
+            depth = tree_node.depth + 1
+            if f != f:
+                f = max(tree_node.f, g + h[neighbour])
+            if depth >= node_budget - 1 and not is_target[neighbour]:
+                # no memory left for a longer path
+                f = float('inf')
+            successor = _SMANode(neighbour, g, f, depth, tree_node, k, indptr[neighbour])
+            tree_node.children[neighbour] = successor
+            stored += 1
+            enqueue(successor)
+
+            if has_new_successors(tree_node) or tree_node.forgotten:
+                enqueue(tree_node)
+            else:
+                # all successors are in memory
+                tree_node.queue_key = None
+                backup(tree_node)
+
+            while stored > node_budget:
+                drop_worst_leaf(successor)
+                stored -= 1
+            result.peak_nodes = max(result.peak_nodes, stored)
+
+    return _measured(search, trace_memory)
+
+
+if __name__ == "__main__":
+    from utils.a_start_algorithm import A_star
+    from utils.array_search import array_a_star
+    from utils.geometry import ManhattenDistance
+
+    parameter = A_star_parameter(distance_method=ManhattenDistance(), h_scale=1.0, edge_weight=(2, 5),
+                                 start_node=1, target_node=67)
+    arrays = GraphArrays.from_graph(A_star(parameter).graph)
+    print(f'A*: {array_a_star(arrays, parameter)}')
+    print(f'IDA*: {ida_star(arrays, parameter)}')
+    print(f'SMA* (budget 200): {sma_star(arrays, parameter, 200)}')
+    print(f'SMA* (budget 40): {sma_star(arrays, parameter, 40)}')
@@ -0,0 +1,76 @@
+# standard lib
+from typing import Union, Tuple, Optional
+from dataclasses import dataclass, field
+
+# Local application imports
+from utils.geometry import DistanceFunc, EuclidianDistance, distance_function_from_name
+from utils import constants as const
+
+
+# fields which define the graph, changes of the other fields only need a new search on the same graph
+GRAPH_FIELDS = ("edge_weight", "grid_width", "grid_height", "terrain")
+
+# order of open nodes with equal f: larger g first, smaller h first, first or last inserted first,
+# smallest deviation from the straight line between start and target first (cross product)
+TIE_BREAKING_POLICIES = ("high_g", "low_h", "fifo", "lifo", "cross_product")
+
+
+@dataclass
+class A_star_parameter:
+    distance_method: DistanceFunc = field(default_factory=EuclidianDistance)
+    h_scale: float = 1.4
+    edge_weight: Union[float, Tuple] = 2.0
+    start_node: int = 1
+    target_node: int = 200
+    disabled_nodes: list[int] = field(default_factory=list[int])
+    additional_target_nodes: list[int] = field(default_factory=list[int])
+    grid_width: int = const.GRID_WIDTH
+    grid_height: int = const.GRID_HEIGHT
+    terrain: Optional[str] = None  # image file of a terrain cost grid, replaces the lattice
+    agents: list[tuple[int, int]] = field(default_factory=list[tuple[int, int]])  # (start, target) for cooperative runs
+    tie_breaking: str = const.TIE_BREAKING  # one of TIE_BREAKING_POLICIES
+
+    @property
+    def node_count(self) -> int:
+        return self.grid_width*self.grid_height
+
+    @property
+    def all_target_nodes(self) -> list[int]:
+        """target_node and the additional target nodes, the search ends at the first one reached"""
+        return [self.target_node] + [node for node in self.additional_target_nodes if node != self.target_node]
+
+    def graph_key(self) -> tuple:
+        """Equal keys describe the same graph, see GRAPH_FIELDS"""
+        return tuple(getattr(self, name) for name in GRAPH_FIELDS)
+
+    def copy(self) -> "A_star_parameter":
+        return A_star_parameter.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        """JSON compatible representation, the distance method is stored by its name"""
+        return {
+            "distance_method": str(self.distance_method),
+            "h_scale": self.h_scale,
+            "edge_weight": list(self.edge_weight) if isinstance(self.edge_weight, tuple) else self.edge_weight,
+            "start_node": self.start_node,
+            "target_node": self.target_node,
+            "disabled_nodes": list(self.disabled_nodes),
+            "additional_target_nodes": list(self.additional_target_nodes),
+            "grid_width": self.grid_width,
+            "grid_height": self.grid_height,
+            "terrain": self.terrain,
+            "agents": [list(agent) for agent in self.agents],
+            "tie_breaking": self.tie_breaking,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "A_star_parameter":
+        """Inverse of to_dict, missing keys keep their default values"""
+        values = dict(values)
+        if "distance_method" in values:
+            values["distance_method"] = distance_function_from_name(values["distance_method"])
+        if isinstance(values.get("edge_weight"), list):
+            values["edge_weight"] = tuple(values["edge_weight"])
+        if "agents" in values:
+            values["agents"] = [tuple(agent) for agent in values["agents"]]
+        return cls(**values)
@@ -0,0 +1,178 @@
+"""Parameter sweep over A_star_parameter values and scenarios.
+Every combination of the swept values is run on every query of every scenario with the array search,
+the results are collected as one row per run (tidy table) and written as CSV or Parquet (needs pandas).
+"""
+# standard lib
+from typing import Optional, List, Dict, Iterable
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import importlib.util
+import itertools
+import json
+import os
+import time
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter
+
+PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None
+
+# order of the columns in the written table
+SWEEP_COLUMNS = ["scenario", "query", "start_node", "target_node", "dijkstra", "distance_method", "h_scale",
+                 "edge_weight", "tie_breaking", "reached", "cost", "optimal_cost", "suboptimality", "expansions", "runtime",
+                 "peak_memory"]
+
+# graphs and optimal costs of the worker process, keyed by their JSON representation
+_worker_graphs: Dict[str, GraphArrays] = {}
+_worker_optimal: Dict[str, float] = {}
+
+
+def parameter_grid(**values: Iterable) -> List[dict]:
+    """Cartesian product of the swept values.
+    Example: parameter_grid(h_scale=[1.0, 1.5], distance_method=["euclidian", "manhatten"]) gives 4 dicts.
+    """
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*[list(values[name]) for name in names])]
+
+
+def _graph(graph_config: dict) -> GraphArrays:
+    key = json.dumps(graph_config, sort_keys=True)
+    if key not in _worker_graphs:
+        from utils.cli import scenario_arrays
+        _worker_graphs[key] = scenario_arrays({"graph": graph_config})
+    return _worker_graphs[key]
+
+
+def _optimal_cost(graph_config: dict, parameter: A_star_parameter) -> float:
+    """Dijkstra cost of the query, independent of the heuristic parameters"""
+    from utils.array_search import array_a_star
+
+    key = json.dumps([graph_config, parameter.start_node, parameter.all_target_nodes, sorted(parameter.disabled_nodes)],
+                     sort_keys=True)
+    if key not in _worker_optimal:
+        _worker_optimal[key] = array_a_star(_graph(graph_config), parameter, dijkstra=True).cost
+    return _worker_optimal[key]
+
+
+def _init_worker():
+    """Compiles (or loads) the search kernel once per process so that it is not part of the runtimes"""
+    from utils.array_search import array_a_star
+
+    array_a_star(GraphArrays.lattice(width=2, height=2), A_star_parameter(start_node=1, target_node=4, grid_width=2, grid_height=2))
+
+
+def _run(task: dict) -> dict:
+    """Runs one query with one parameter combination and returns its table row"""
+    from utils.array_search import array_a_star, search_memory
+
+    graph_config = dict(task["graph"])
+    query = dict(task["query"])
+    dijkstra = bool(query.pop("dijkstra", False))
+    query.update(task["values"])
+    if "edge_weight" in task["values"]:
+        # the edge weight is a property of the graph, not of the search
+        graph_config["edge_weight"] = task["values"]["edge_weight"]
+    query["edge_weight"] = graph_config.get("edge_weight", A_star_parameter.edge_weight)
+    query.setdefault("grid_width", graph_config.get("width", A_star_parameter.grid_width))
+    query.setdefault("grid_height", graph_config.get("height", A_star_parameter.grid_height))
+    parameter = A_star_parameter.from_dict(query)
+    arrays = _graph(graph_config)
+
+    runtime = float('inf')
+    for _ in range(task["repeat"]):
+        t_start = time.perf_counter()
+        result = array_a_star(arrays, parameter, dijkstra)
+        runtime = min(runtime, time.perf_counter() - t_start)
+
+    optimal = _optimal_cost(graph_config, parameter)
+    return {
+        "scenario": task["scenario"],
+        "query": task["query_number"],
+        "start_node": parameter.start_node,
+        "target_node": parameter.target_node,
+        "dijkstra": dijkstra,
+        "distance_method": str(parameter.distance_method),
+        "h_scale": parameter.h_scale,
+        "edge_weight": json.dumps(graph_config.get("edge_weight", A_star_parameter.edge_weight)),
+        "tie_breaking": parameter.tie_breaking,
+        "reached": result.reached,
+        "cost": result.cost,
+        "optimal_cost": optimal,
+        "suboptimality": result.cost/optimal if result.reached and optimal > 0 else float('nan'),
+        "expansions": result.expansions,
+        "runtime": runtime,
+        "peak_memory": search_memory(arrays.node_count, result.peak_open),
+    }
+
+
+def run_sweep(scenarios: List[dict], grid: List[dict], workers: Optional[int] = None, repeat: int = 1) -> List[dict]:
+    """Runs every parameter combination on every query of the scenarios in a process pool.
+    Args:
+        scenarios: scenario dicts as read by cli.load_scenario
+        grid: parameter combinations, see parameter_grid. Keys are fields of A_star_parameter
+        workers: number of processes, None for the CPU count
+        repeat: runs per combination, the minimal runtime is reported
+    Returns:
+        List[dict]: one row per scenario, query and combination with the columns SWEEP_COLUMNS
+    """
+    tasks = [{"scenario": scenario_number, "graph": scenario.get("graph", {}), "query_number": query_number,
+              "query": query, "values": values, "repeat": max(1, repeat)}
+             for scenario_number, scenario in enumerate(scenarios)
+             for query_number, query in enumerate(scenario.get("queries", [{}]))
+             for values in (grid or [{}])]
+    chunksize = max(1, len(tasks)//(4*(workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(_run, tasks, chunksize=chunksize))
+
+
+def write_table(rows: List[dict], path: str, columns: List[str] = SWEEP_COLUMNS):
+    """Writes the rows as Parquet (file ending .parquet, needs pandas) or CSV"""
+    if path.lower().endswith(".parquet"):
+        if not PANDAS_AVAILABLE:
+            raise RuntimeError("pandas (and pyarrow) is needed for Parquet output, use a .csv file instead!")
+        import pandas as pd  # type: ignore
+        pd.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def plot_summary(rows: List[dict], out_path: str):
+    """Mean expansions vs. mean suboptimality per h_scale, one line per heuristic, edge weight and tie-breaking.
+    Rendered off-screen with the Agg backend.
+    """
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    groups: Dict[tuple, Dict[float, List[dict]]] = {}
+    for row in rows:
+        if row["reached"] and not row["dijkstra"]:
+            key = (row["distance_method"], row["edge_weight"], row["tie_breaking"])
+            groups.setdefault(key, {}).setdefault(row["h_scale"], []).append(row)
+
+    figure = Figure(figsize=(8, 5))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    for (distance_method, edge_weight, tie_breaking), by_scale in sorted(groups.items()):
+        scales = sorted(by_scale)
+        suboptimality = [np.nanmean([row["suboptimality"] for row in by_scale[scale]]) for scale in scales]
+        expansions = [np.mean([row["expansions"] for row in by_scale[scale]]) for scale in scales]
+        label = distance_method
+        if len(set(key[1] for key in groups)) > 1:
+            label += f", weight {edge_weight}"
+        if len(set(key[2] for key in groups)) > 1:
+            label += f", {tie_breaking}"
+        ax.plot(suboptimality, expansions, marker="o", label=label)
+        for scale, x, y in zip(scales, suboptimality, expansions):
+            ax.annotate(f"{scale:g}", (x, y), textcoords="offset points", xytext=(4, 4), fontsize=8)
+    ax.set_xlabel("path cost / optimal cost")
+    ax.set_ylabel("expansions")
+    ax.set_title("Expansions vs. suboptimality (labels: h_scale)")
+    ax.grid(True, alpha=0.3)
+    if groups:
+        ax.legend()
+    figure.savefig(out_path, dpi=100)
@@ -0,0 +1,269 @@
+"""Local asyncio path query service.
+The graph is loaded once, queries are answered by the array search in an executor pool.
+Identical queries which are in flight at the same time are computed only once, a bounded
+queue rejects requests with 503 when the workers can not keep up.
+
+HTTP API (TCP or unix socket):
+    POST /path      JSON body with the fields of A_star_parameter.to_dict (+ "dijkstra")
+    GET  /metrics   latency histograms and counters as JSON
+    GET  /health
+"""
+# standard lib
+from typing import Optional, Dict, List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+import asyncio
+import bisect
+import json
+import math
+import time
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+from utils.parameter import A_star_parameter, TIE_BREAKING_POLICIES
+
+# upper bounds of the latency buckets in seconds, the last bucket is unbounded
+LATENCY_BUCKETS = [0.0001*2**i for i in range(18)]
+
+# graph of the worker process, set by _init_worker
+_worker_arrays: Optional[GraphArrays] = None
+
+
+def _init_worker(arrays: GraphArrays):
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _solve(query: dict) -> dict:
+    """Runs one query on the graph of the worker"""
+    from utils.array_search import array_a_star
+
+    query = dict(query)
+    dijkstra = bool(query.pop("dijkstra", False))
+    result = array_a_star(_worker_arrays, A_star_parameter.from_dict(query), dijkstra)
+    return asdict(result)
+
+
+class LatencyHistogram():
+    """Fixed bucket histogram, cheap enough to be updated for every request"""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound of the q quantile"""
+        if self.count == 0:
+            return 0.0
+        rank = q*self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total/self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {f"le_{bound:g}": count for bound, count in zip(self.buckets, self.counts) if count},
+            "overflow": self.counts[-1],
+        }
+
+
+class PathService():
+    """Answers path queries on one graph.
+    Args:
+        arrays: graph in array layout
+        workers: number of executor workers (processes or threads)
+        queue_size: maximal number of queued distinct queries, further requests are rejected
+        use_threads: uses a thread pool instead of a process pool
+    """
+
+    def __init__(self, arrays: GraphArrays, workers: int = 4, queue_size: int = 256, use_threads: bool = False):
+        self.arrays = arrays
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.executor: Executor
+        if use_threads:
+            _init_worker(arrays)
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arrays,))
+        self.latency = {"request": LatencyHistogram(), "queue": LatencyHistogram(), "compute": LatencyHistogram()}
+        self.counters = {"requests": 0, "coalesced": 0, "rejected": 0, "computed": 0, "errors": 0}
+        self._dispatchers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Starts the dispatchers after one warm up query per worker (imports, JIT compilation)"""
+        loop = asyncio.get_running_loop()
+        warm_up = {"start_node": 1, "target_node": self.arrays.node_count}
+        await asyncio.gather(*[loop.run_in_executor(self.executor, _solve, warm_up) for _ in range(self.workers)])
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    async def _dispatch(self):
+        """Moves queued queries to the executor, one at a time per worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            key, query, future, t_queued = await self.queue.get()
+            t_start = time.perf_counter()
+            self.latency["queue"].observe(t_start - t_queued)
+            try:
+                result = await loop.run_in_executor(self.executor, _solve, query)
+                self.counters["computed"] += 1
+                future.set_result(result)
+            except Exception as e:
+                self.counters["errors"] += 1
+                future.set_exception(e)
+            finally:
+                self.latency["compute"].observe(time.perf_counter() - t_start)
+                self.in_flight.pop(key, None)
+                self.queue.task_done()
+
+    async def query(self, query: dict) -> dict:
+        """Result of one query. Raises asyncio.QueueFull if the service is overloaded."""
+        key = json.dumps(query, sort_keys=True)
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait((key, query, future, time.perf_counter()))
+            self.in_flight[key] = future
+        # shield: a disconnecting client must not cancel the result of the other waiting clients
+        return await asyncio.shield(future)
+
+    def metrics(self) -> dict:
+        metrics: dict = dict(self.counters)
+        metrics.update(queue_length=self.queue.qsize(), in_flight=len(self.in_flight))
+        metrics["latency"] = {name: histogram.snapshot() for name, histogram in self.latency.items()}
+        return metrics
+
+    def check_query(self, query) -> A_star_parameter:
+        """Parameters of a query body, checked before it is queued.
+        Raises:
+            TypeError, ValueError: the search can not run with the query
+        """
+        if not isinstance(query, dict):
+            raise TypeError("the body must be a JSON object")
+        if not isinstance(query.get("distance_method", ""), str):
+            raise TypeError("distance_method must be a name, e.g. euclidian or manhatten")
+        if not isinstance(query.get("dijkstra", False), bool):
+            raise TypeError("dijkstra must be true or false")
+        for name in ("disabled_nodes", "additional_target_nodes"):
+            if not isinstance(query.get(name, []), list):
+                raise TypeError(f"{name} must be a list of node ids")
+        parameter = A_star_parameter.from_dict({key: value for key, value in query.items() if key != "dijkstra"})
+        if not _is_number(parameter.h_scale) or not 0 <= parameter.h_scale < math.inf:
+            raise ValueError(f"h_scale {parameter.h_scale!r} must be a finite number >= 0")
+        if parameter.tie_breaking not in TIE_BREAKING_POLICIES:
+            raise ValueError(f"tie_breaking {parameter.tie_breaking!r} is not one of {TIE_BREAKING_POLICIES}")
+        edge_weights = parameter.edge_weight if isinstance(parameter.edge_weight, tuple) else (parameter.edge_weight,)
+        if len(edge_weights) not in (1, 2) or not all(_is_number(weight) for weight in edge_weights):
+            raise ValueError(f"edge_weight {parameter.edge_weight!r} must be a number or [min, max]")
+        node_ids = [parameter.start_node] + parameter.all_target_nodes + list(parameter.disabled_nodes)
+        for node_id in node_ids:
+            if not isinstance(node_id, int) or isinstance(node_id, bool) or not 1 <= node_id <= self.arrays.node_count:
+                raise ValueError(f"node id {node_id!r} is not in 1..{self.arrays.node_count}")
+        return parameter
+
+    async def handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        """Returns HTTP status and JSON response for one request"""
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "nodes": self.arrays.node_count}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+        if method != "POST" or path != "/path":
+            return 404, {"error": f"unknown endpoint {method} {path}"}
+        self.counters["requests"] += 1
+        t_start = time.perf_counter()
+        try:
+            query = json.loads(body or b"{}")
+            self.check_query(query)
+        except (ValueError, TypeError) as e:
+            return 400, {"error": f"invalid query: {e}"}
+        try:
+            result = await self.query(query)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return 503, {"error": "overloaded, retry later"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+        self.latency["request"].observe(time.perf_counter() - t_start)
+        return 200, result
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1 with keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, response = await self.handle_request(method, path, body)
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+                if status == 503:
+                    head += "Retry-After: 1\r\n"
+                writer.write(head.encode() + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def serve(arrays: GraphArrays, host: str = "127.0.0.1", port: int = 8080, unix_socket: Optional[str] = None,
+                workers: int = 4, queue_size: int = 256, use_threads: bool = False):
+    """Runs the service until it is cancelled"""
+    service = PathService(arrays, workers, queue_size, use_threads)
+    await service.start()
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_socket)
+        print(f"serving {arrays.node_count} nodes on unix socket {unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        print(f"serving {arrays.node_count} nodes on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
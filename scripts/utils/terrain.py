@@ -0,0 +1,66 @@
+"""Terrain cost grids from NumPy arrays or greyscale images.
+The pixel value is the cost of traversing the cell, black (0) cells are blocked.
+"""
+# standard lib
+from typing import Union
+
+# Third-party imports
+import numpy as np
+
+# Local application imports
+from utils.graph_arrays import GraphArrays
+
+
+def load_terrain(source: Union[str, np.ndarray]) -> np.ndarray:
+    """Cost raster of an image file or a 2-D array.
+    Images are read with matplotlib (PNG without Pillow), colors are converted to their luminance
+    and scaled to 0..255. Images are flipped so that row 0 is the bottom row like the graph y axis.
+    Args:
+        source: image file path or 2-D array of costs (row 0 at the bottom)
+    Returns:
+        np.ndarray: (height, width) float64 costs, <= 0 for blocked cells
+    """
+    if not isinstance(source, str):
+        costs = np.asarray(source, dtype=np.float64)
+        if costs.ndim != 2:
+            raise ValueError(f'Terrain array has to be 2-D, got shape {costs.shape}!')
+        return costs
+    import matplotlib.image as mpimg
+
+    image = mpimg.imread(source)
+    if image.ndim == 3:
+        # RGB(A): luminance, the alpha channel is ignored
+        image = image[:, :, :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    costs = image.astype(np.float64)
+    if np.issubdtype(image.dtype, np.floating):
+        costs = np.round(255*costs)
+    return np.ascontiguousarray(costs[::-1])
+
+
+def save_terrain(costs: np.ndarray, path: str):
+    """Writes integer costs 0..255 as greyscale PNG, load_terrain(path) returns the same costs"""
+    import matplotlib.image as mpimg
+
+    grey = np.clip(np.asarray(costs, dtype=np.float64), 0, 255)[::-1]/255
+    mpimg.imsave(path, np.repeat(grey[:, :, None], 3, axis=2))
+
+
+def terrain_arrays(source: Union[str, np.ndarray]) -> GraphArrays:
+    """Graph of a terrain image or array, see GraphArrays.from_terrain"""
+    return GraphArrays.from_terrain(load_terrain(source))
+
+
+if __name__ == "__main__":
+    import time
+    from utils.array_search import array_search
+
+    rng = np.random.default_rng(0)
+    costs = rng.integers(2, 256, size=(2000, 2000)).astype(np.float64)
+    costs[rng.random(costs.shape) < 0.2] = 0
+    costs[0, 0] = costs[-1, -1] = 2
+    t_start = time.perf_counter()
+    arrays = GraphArrays.from_terrain(costs)
+    t_build = time.perf_counter() - t_start
+    result = array_search(arrays, 1, arrays.node_count, np.zeros(arrays.node_count))
+    print(f'{arrays.node_count} nodes, {arrays.edge_count} edges built in {t_build:.2f} s, '
+          f'path cost {result.cost:g} with {result.expansions} expansions')